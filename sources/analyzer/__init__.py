@@ -0,0 +1,357 @@
+"""
+Background analysis of submitted claims.
+
+Is an `analyzer` entrypoint of the main package.
+
+Should be initialized with `utilities.loadmodule` after the database.
+"""
+
+import uuid
+import asyncio
+import logging
+import functools
+
+from typing import AsyncIterator
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from fastapi import FastAPI
+from pymongo.errors import DuplicateKeyError
+from beanie.operators import In, Or
+
+from ailabs.claims import fake, stats, images, openai, metrics, extraction
+from ailabs.claims.cache import Cache
+from ailabs.claims.memory import Budget
+from ailabs.claims.server import Config
+from ailabs.claims.backends import Backend
+from ailabs.claims.responses import RESPONSES
+from ailabs.claims.database.models import CLAIM, RESULT, DOCUMENT
+
+from . import intake, leases, failures
+from .batch import Batcher
+from .rules import Rules
+from .scheduler import Scheduler
+from .checkpoint import Checkpoint
+
+
+# claims discovered together and decided by rules in one round trip, at most
+DISCOVERY: int = 100
+
+
+@dataclass
+class Context:
+    """
+    Services shared by all analyzer workers.
+    """
+
+    config: Config
+
+    backend: Backend
+
+    # OpenAI client, used by batch analysis
+    client: openai.AsyncOpenAI
+
+    budget: Budget
+
+    # claims decided without the model, if enabled
+    rules: Rules | None
+
+    cache: Cache | None
+
+    # CPU-bound stages
+    executor: Executor
+
+
+async def size(claim: CLAIM) -> int:
+    """
+    Count bytes of claim documents loaded for analysis, preprocessed images included.
+    """
+    sizes = await DOCUMENT.find(
+        Or(DOCUMENT.ID == claim.document, DOCUMENT.claim == claim.ID),
+    ).aggregate(
+        [
+            {
+                "$group": {
+                    "_id": None,
+                    "size": {
+                        "$sum": {
+                            "$add": [
+                                {"$binarySize": "$data"},
+                                {"$ifNull": [{"$binarySize": "$image.data"}, 0]},
+                            ],
+                        },
+                    },
+                },
+            },
+        ],
+    ).to_list()
+
+    return sizes[0]["size"] if sizes else 0
+
+
+async def gather(context: Context, claim: CLAIM) -> tuple[DOCUMENT | None, list[DOCUMENT]]:
+    """
+    Fetch claim main document and attachments, preprocessing images and extracting text.
+    """
+    document = None
+
+    with metrics.stage("fetch"):
+        if claim.document:
+            document = await DOCUMENT.find_one(DOCUMENT.ID == claim.document)
+
+        documents = await DOCUMENT.find(
+            DOCUMENT.claim == claim.ID,
+        ).to_list()
+
+    if document is not None:
+        documents = list(filter(lambda item: item.ID != document.ID, documents))
+
+    options, files = context.config.analyzer.images, [item for item in (document, *documents) if item]
+
+    if options.enabled and files:
+        with metrics.stage("images"):
+            await images.prepare(files, options, context.executor)
+
+    if context.config.analyzer.extraction.enabled and files:
+        with metrics.stage("extraction"):
+            await extraction.prepare(files, context.config.analyzer.extraction, options, context.executor)
+
+    return document, documents
+
+
+async def conclude(claim: CLAIM, answer: dict) -> RESULT | None:
+    """
+    Make and store claim result from the model answer.
+
+    Returns None, if claim is already analyzed.
+    """
+    claim.material = (answer["document"] or {}).get("material", claim.material)
+
+    if answer["response"]:
+        answer["response"]["damage"] = RESULT.Damage(**answer["response"].pop("damage"))
+
+    result = RESULT(
+        ID=claim.ID,
+        status=RESULT.Status.RESEARCH,
+        **answer["document"] or {"relevant": True},
+        **answer["response"] or {},
+    )
+
+    if not answer["document"] and not answer["response"]:
+        result.status = RESULT.Status.REJECTED
+        result.reason = RESULT.Reason.NOT_ENOUGH_DOCUMENTS
+
+    elif not result.relevant:
+        result.status = RESULT.Status.REJECTED
+        result.reason = RESULT.Reason.NOT_RELEVANT
+
+    try:
+        # unique index guards against results of several instances
+        with metrics.stage("insert"):
+            await result.insert()
+    except DuplicateKeyError:
+        logger.warning("Claim %s is already analyzed", claim.ID)
+        return None
+
+    metrics.RESULTS.labels(result.status.value, result.reason.value if result.reason else "").inc()
+
+    await stats.record(*stats.concluded(result.status))
+
+    with metrics.stage("save"):
+        await CLAIM.find_one(CLAIM.ID == claim.ID).update(
+            {
+                # the result is part of the claim read, exports pick it up by the update date
+                "$set": {"material": claim.material, "updated": datetime.now(timezone.utc).date()},
+                "$unset": {"failure": "", "checkpoint": ""},
+                "$inc": {"revision": 1},
+            },
+        )
+
+    RESPONSES.changed()
+
+    logger.info(result)
+    logger.info(claim)
+
+    return result
+
+
+async def analyze(context: Context, claim: CLAIM) -> None:
+    # documents are held in memory until the model answers
+    async with context.budget.reserve(await size(claim)):
+        document, documents = await gather(context, claim)
+
+        if document is None and not documents:
+            answer = {"document": None, "response": None}
+
+        else:
+            answer = await openai.analyze(
+                context.backend,
+                claim,
+                document,
+                documents,
+                cache=Checkpoint(claim, context.cache),
+                stream=context.config.analyzer.stream,
+            )
+
+    await conclude(claim, answer)
+
+
+async def process(context: Context, claim: CLAIM | CLAIM.Brief) -> None:
+    # claim could be finished since discovery
+    if (await RESULT.find_one(RESULT.ID == claim.ID)) is not None:
+        return
+
+    async with leases.lease(claim.ID, context.config.analyzer.lease) as leased:
+        if leased is None:
+            logger.debug("Claim %s is processed by another instance", claim.ID)
+            return
+
+        try:
+            await analyze(context, leased)
+        except Exception as error:
+            await failures.record(leased, error, context.config.analyzer.retry)
+
+
+async def analyzer(context: Context, scheduler: Scheduler) -> None:
+    logger.info("Background task started: [bold cyan]analyzer[/] as %s", leases.OWNER, extra={"markup": True})
+
+    config = context.config
+
+    metrics.QUEUE.set_function(scheduler.queue.qsize)
+    metrics.ACTIVE.set_function(lambda: scheduler.active)
+
+    batcher, client = None, context.client
+
+    if config.analyzer.batch.enabled and config.analyzer.backend.name != "openai":
+        logger.warning("Batch analysis requires OpenAI backend, it is disabled")
+
+    elif config.analyzer.batch.enabled:
+        if config.analyzer.batch.url is not None:
+            client = openai.AsyncOpenAI(
+                api_key=config.general.token.get_secret_value(),
+                base_url=config.analyzer.batch.url,
+            )
+
+        batcher = Batcher(
+            client,
+            config.analyzer.batch,
+            config.analyzer.lease,
+            model=config.analyzer.backend.model,
+            gather=functools.partial(gather, context),
+            conclude=conclude,
+            fallback=scheduler.submit,
+            rules=context.rules,
+        )
+
+    async def decided(claims: list[CLAIM | CLAIM.Brief]) -> set[uuid.UUID]:
+        """
+        Decide discovered claims by rules at once, before they reach the model.
+        """
+        identifiers = [claim.ID for claim in claims]
+
+        try:
+            if context.rules is None or not await context.rules.apply(In(CLAIM.ID, identifiers)):
+                return set()
+
+            results = await RESULT.find(In(RESULT.ID, identifiers)).aggregate(
+                [{"$project": {"_id": 0, "ID": 1}}],
+            ).to_list()
+
+        except Exception as error:
+            # claims are analyzed by the model then
+            logger.error("Failed to apply rules", exc_info=error)
+            return set()
+
+        return {result["ID"] for result in results}
+
+    async def discover(claims: AsyncIterator[CLAIM | CLAIM.Brief]) -> None:
+        async for group in intake.batched(claims, DISCOVERY):
+            skipped = await decided(group)
+
+            for claim in group:
+                if claim.ID not in skipped:
+                    await submit(claim)
+
+    async def submit(claim: CLAIM | CLAIM.Brief) -> None:
+        if claim.ID in scheduler:
+            return
+
+        if batcher is not None:
+            if claim.ID in batcher:
+                return
+
+            # claims which can wait are analyzed offline
+            if batcher.eligible(claim):
+                batcher.add(claim)
+                return
+
+        # submit claims for processing, blocks while backlog is full
+        await scheduler.submit(claim)
+
+        logger.debug("Currently processing claims: %s", len(scheduler))
+
+    try:
+        async with scheduler, asyncio.TaskGroup() as group:
+            group.create_task(discover(intake.watch(config.general.interval)))
+            group.create_task(discover(leases.expired(config.analyzer.lease)))
+            group.create_task(discover(failures.due(config.general.interval)))
+
+            if context.rules is not None:
+                group.create_task(context.rules.sweep(config.general.interval))
+
+            if batcher is not None:
+                group.create_task(batcher.run())
+
+    finally:
+        context.executor.shutdown(wait=False, cancel_futures=True)
+
+        if client is not context.client:
+            await client.close()
+
+
+def backend(server: FastAPI) -> Backend:
+    """
+    Create analysis backend selected in settings.
+    """
+    options = server.state.config.analyzer.backend
+
+    if options.name == "fake":
+        # own model name keeps fake answers apart from the real ones in the answers cache and checkpoints
+        return fake.Fake(options.fake, f"fake:{options.model}")
+
+    return openai.OpenAI(server.state.openai, server.state.http, options.model, limiter=server.state.limiter)
+
+
+async def initialize(server: FastAPI) -> None:
+    config: Config = server.state.config
+
+    cache = server.state.cache = None
+
+    if config.analyzer.cache.enabled:
+        cache = server.state.cache = Cache(config.analyzer.cache.ttl, config.analyzer.cache.size)
+
+    context = Context(
+        config=config,
+        backend=backend(server),
+        client=server.state.openai,
+        budget=Budget(config.analyzer.memory),
+        rules=Rules(config.analyzer.rules, config.general.threshold) if config.analyzer.rules.enabled else None,
+        cache=cache,
+        executor=ProcessPoolExecutor(config.analyzer.images.processes),
+    )
+
+    scheduler = Scheduler(
+        functools.partial(process, context),
+        workers=config.analyzer.workers,
+        backlog=config.analyzer.backlog,
+        priority=config.analyzer.priority,
+    )
+
+    # let in-flight analyses finish on shutdown
+    server.state.tasks.drains.append(scheduler.drain)
+
+    server.state.tasks.add(analyzer(context, scheduler))
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,323 @@
+"""
+Offline claims analysis with an OpenAI-compatible Batch API.
+
+Eligible claims are collected and submitted as JSONL batch jobs, finished jobs
+are fanned back into results. Claims in a job are marked with its identifier,
+so they are neither leased nor discovered again meanwhile.
+"""
+
+import json
+import uuid
+import asyncio
+import logging
+import tempfile
+import itertools
+import contextlib
+
+from typing import Callable, Awaitable
+from datetime import datetime, timezone, timedelta
+from collections import defaultdict
+
+from openai import AsyncOpenAI
+from beanie.operators import In, NotIn
+
+from ailabs.claims import openai
+from ailabs.claims.database.models import BATCH, CLAIM, RESULT, DOCUMENT
+from ailabs.claims.settings.analyzer import Batch
+
+from . import leases
+from .rules import Rules
+
+
+__all__: tuple[str] = ("Batcher",)
+
+
+ENDPOINT: str = "/v1/chat/completions"
+
+# https://platform.openai.com/docs/api-reference/batch/object
+FINISHED: frozenset[str] = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+class Batcher:
+    """
+    Collects claims into batch jobs and concludes claims of the finished ones.
+
+    Claims without complete answers, e.g. of failed or expired jobs, are passed
+    to `fallback` for interactive analysis.
+
+    Parameters
+    ----------
+    client : AsyncOpenAI
+        Client of the API serving files and batches endpoints.
+    options : Batch
+        Batch analysis settings.
+    lease : timedelta
+        Claim lease duration while the job is prepared.
+    model : str
+        Model name.
+    gather : Callable[[CLAIM], Awaitable[tuple[DOCUMENT | None, list[DOCUMENT]]]]
+        Fetches claim documents.
+    conclude : Callable[[CLAIM, dict], Awaitable]
+        Stores claim result from the model answer.
+    fallback : Callable[[CLAIM], Awaitable]
+        Submits claim for interactive analysis.
+    rules : Rules, optional
+        Rules deciding claims before they are submitted.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        options: Batch,
+        lease: timedelta,
+        *,
+        model: str = openai.MODEL,
+        gather: Callable[[CLAIM], Awaitable[tuple[DOCUMENT | None, list[DOCUMENT]]]],
+        conclude: Callable[[CLAIM, dict], Awaitable],
+        fallback: Callable[[CLAIM], Awaitable],
+        rules: Rules | None = None,
+    ) -> None:
+        self.client, self.options, self.lease, self.model = client, options, lease, model
+
+        self.gather, self.conclude, self.fallback = gather, conclude, fallback
+
+        self.rules = rules
+
+        # claims waiting for the next job
+        self.pending: dict[uuid.UUID, CLAIM | CLAIM.Brief] = {}
+
+        self.full = asyncio.Event()
+
+    def __contains__(self, claim: uuid.UUID) -> bool:
+        return claim in self.pending
+
+    def eligible(self, claim: CLAIM | CLAIM.Brief) -> bool:
+        """
+        Check if claim can wait for the batch job.
+        """
+        if self.options.amount is not None and claim.amount <= self.options.amount:
+            return True
+
+        age = datetime.now(timezone.utc).date() - claim.created
+
+        return self.options.age is not None and age >= self.options.age
+
+    def add(self, claim: CLAIM | CLAIM.Brief) -> None:
+        self.pending[claim.ID] = claim
+
+        if len(self.pending) >= self.options.size:
+            self.full.set()
+
+    async def run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self.full.wait(), self.options.interval.total_seconds())
+
+            self.full.clear()
+
+            try:
+                if self.pending:
+                    await self.flush()
+
+                await self.poll()
+
+            except Exception as error:
+                logger.error("Failed to process batch jobs", exc_info=error)
+
+    async def flush(self) -> None:
+        """
+        Submit collected claims as a single batch job.
+        """
+        briefs = list(itertools.islice(self.pending.values(), self.options.size))
+
+        for brief in briefs:
+            del self.pending[brief.ID]
+
+        if len(self.pending) >= self.options.size:
+            self.full.set()
+
+        try:
+            failed = await self.submit(briefs)
+
+        except Exception:
+            # nothing rediscovers them until restart otherwise, claims already analyzed are skipped next time
+            for brief in briefs:
+                self.pending.setdefault(brief.ID, brief)
+
+            raise
+
+        for claim in failed:
+            await self.fallback(claim)
+
+    async def submit(self, briefs: list[CLAIM | CLAIM.Brief]) -> list[CLAIM]:
+        """
+        Submit batch job of the claims not analyzed yet.
+
+        Returns claims failed to be prepared, to be analyzed interactively.
+        """
+        if self.rules is not None:
+            await self.rules.apply(In(CLAIM.ID, [brief.ID for brief in briefs]))
+
+        # requested analysis kinds by claim
+        claims: dict[str, list[str]] = {}
+
+        owned: list[uuid.UUID] = []
+
+        failed: list[CLAIM] = []
+
+        # requests are spooled to disk to keep memory flat
+        with tempfile.TemporaryFile() as buffer:
+            try:
+                for brief in briefs:
+                    if (await RESULT.find_one(RESULT.ID == brief.ID)) is not None:
+                        continue
+
+                    if (claim := await leases.acquire(brief.ID, self.lease)) is None:
+                        continue
+
+                    owned.append(claim.ID)
+
+                    try:
+                        selected = openai.select(*await self.gather(claim))
+
+                        if not selected:
+                            # nothing to ask the model about
+                            await self.conclude(claim, {"document": None, "response": None})
+                            continue
+
+                    except Exception as error:
+                        # interactive analysis records the failure and retries
+                        logger.warning("Failed to prepare claim %s for batch", claim.ID, exc_info=error)
+                        failed.append(claim)
+                        continue
+
+                    for kind, files in selected.items():
+                        request = {
+                            "custom_id": f"{claim.ID}/{kind}",
+                            "method": "POST",
+                            "url": ENDPOINT,
+                            "body": openai.body(openai.content(kind, claim, files), model=self.model),
+                        }
+
+                        _, chunks = openai.serialize(request)
+
+                        buffer.writelines(chunks)
+                        buffer.write(b"\n")
+
+                    claims[str(claim.ID)] = list(selected)
+
+                if not claims:
+                    return failed
+
+                buffer.seek(0)
+
+                file = await self.client.files.create(file=("claims.jsonl", buffer), purpose="batch")
+
+                job = await self.client.batches.create(
+                    input_file_id=file.id,
+                    endpoint=ENDPOINT,
+                    completion_window="24h",
+                )
+
+                await BATCH(ID=job.id, status=job.status, claims=claims).insert()
+
+                await CLAIM.find(In(CLAIM.ID, [uuid.UUID(claim) for claim in claims])).update(
+                    {"$set": {"batch": job.id}},
+                )
+
+                logger.info("Submitted batch %s with claims: %s", job.id, len(claims))
+
+            finally:
+                await CLAIM.find(In(CLAIM.ID, owned), CLAIM.lease.owner == leases.OWNER).update(
+                    {"$unset": {"lease": ""}},
+                )
+
+        return failed
+
+    async def poll(self) -> None:
+        """
+        Update status of the running jobs, conclude finished ones.
+        """
+        async for batch in BATCH.find(NotIn(BATCH.status, FINISHED)):
+            job = await self.client.batches.retrieve(batch.ID)
+
+            # only one instance concludes the job
+            changed = await BATCH.find_one(BATCH.ID == batch.ID, BATCH.status == batch.status).update(
+                {"$set": {"status": job.status}},
+            )
+
+            if job.status not in FINISHED or not changed.modified_count:
+                continue
+
+            logger.info("Batch %s is %s", job.id, job.status)
+
+            # the job is not polled anymore, its claims are returned to interactive analysis on failure
+            try:
+                answers = await self.download(job.output_file_id) if job.output_file_id else {}
+            except Exception as error:
+                logger.error("Failed to download batch %s output", job.id, exc_info=error)
+                answers = {}
+
+            await self.finalize(batch, answers)
+
+    async def download(self, file: str) -> dict[str, dict[str, dict]]:
+        """
+        Read job output as parsed answers by claim and analysis kind.
+        """
+        content = await self.client.files.content(file)
+
+        answers: dict[str, dict[str, dict]] = defaultdict(dict)
+
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+
+            item = json.loads(line)
+
+            claim, kind = item["custom_id"].split("/", 1)
+
+            if item.get("error") or item["response"]["status_code"] != 200:  # noqa: PLR2004
+                logger.warning("Batch request %s failed: %s", item["custom_id"], item.get("error"))
+                continue
+
+            openai.usage(item["response"]["body"])
+
+            try:
+                answers[claim][kind] = json.loads(item["response"]["body"]["choices"][0]["message"]["content"])
+            except (KeyError, IndexError, json.JSONDecodeError) as error:
+                logger.warning("Batch request %s has invalid answer", item["custom_id"], exc_info=error)
+
+        return answers
+
+    async def finalize(self, batch: BATCH, answers: dict[str, dict[str, dict]]) -> None:
+        identifiers = [uuid.UUID(claim) for claim in batch.claims]
+
+        incomplete: list[uuid.UUID] = []
+
+        try:
+            for identifier, kinds in batch.claims.items():
+                received = answers.get(identifier, {})
+
+                if not set(kinds).issubset(received):
+                    incomplete.append(uuid.UUID(identifier))
+                    continue
+
+                try:
+                    if (claim := await CLAIM.find_one(CLAIM.ID == uuid.UUID(identifier))) is not None:
+                        await self.conclude(claim, {"document": None, "response": None} | received)
+                except Exception as error:
+                    logger.error("Failed to conclude claim %s of batch %s", identifier, batch.ID, exc_info=error)
+                    incomplete.append(uuid.UUID(identifier))
+
+        finally:
+            # claims in batch are skipped by intake and leasing, they must not stay there
+            await CLAIM.find(In(CLAIM.ID, identifiers), CLAIM.batch == batch.ID).update({"$unset": {"batch": ""}})
+
+        if incomplete:
+            logger.warning("Batch %s claims are returned to interactive analysis: %s", batch.ID, len(incomplete))
+
+        async for claim in CLAIM.find(In(CLAIM.ID, incomplete), CLAIM.status == "OPEN"):
+            await self.fallback(claim)
+
+
+logger = logging.getLogger(__name__)
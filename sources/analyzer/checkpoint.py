@@ -0,0 +1,47 @@
+"""
+Checkpoints of the model answers received by the claim analysis.
+
+Answers are stored on the claim as soon as they are received, so analysis
+interrupted on shutdown does not pay for them again.
+"""
+
+from typing import Any
+
+from ailabs.claims.cache import Cache
+from ailabs.claims.database.models import CLAIM
+
+
+__all__: tuple[str] = ("Checkpoint",)
+
+
+class Checkpoint:
+    """
+    Answers store of a single claim analysis, backed by the answers `cache`, if any.
+
+    Parameters
+    ----------
+    claim : CLAIM
+        Analyzed claim, with checkpoint of the previous attempt.
+    cache : Cache, optional
+        Answers cache shared by all claims.
+    """
+
+    def __init__(self, claim: CLAIM, cache: Cache | None = None) -> None:
+        self.claim, self.cache = claim, cache
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        if (answer := (self.claim.checkpoint or {}).get(key)) is not None:
+            return answer
+
+        return await self.cache.get(key) if self.cache is not None else None
+
+    async def set(self, key: str, answer: dict[str, Any]) -> None:
+        # fields can not be set inside null
+        await CLAIM.find_one(CLAIM.ID == self.claim.ID, CLAIM.checkpoint == None).update(  # noqa: E711
+            {"$set": {"checkpoint": {}}},
+        )
+
+        await CLAIM.find_one(CLAIM.ID == self.claim.ID).update({"$set": {f"checkpoint.{key}": answer}})
+
+        if self.cache is not None:
+            await self.cache.set(key, answer)
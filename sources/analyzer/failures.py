@@ -0,0 +1,111 @@
+"""
+Failed analyses: retries with exponential backoff and dead-lettering.
+
+Claims waiting for retry are skipped by discovery and leasing until their retry
+time; dead-lettered claims are skipped until requeued.
+"""
+
+import random
+import asyncio
+import logging
+
+from typing import AsyncIterator
+from datetime import datetime, timezone, timedelta
+
+from openai import APIStatusError
+
+from ailabs.claims.database.models import CLAIM
+from ailabs.claims.settings.analyzer import Retry
+
+from . import intake
+
+
+__all__: tuple[str] = ("delay", "due", "permanent", "record", "requeue")
+
+
+# client errors which may pass on the next attempt
+TRANSIENT: frozenset[int] = frozenset({408, 409, 429})
+
+# stored error message length
+LENGTH: int = 1000
+
+
+def leaves(error: BaseException) -> list[BaseException]:
+    """
+    Flatten exception groups raised by concurrent analysis steps.
+    """
+    if isinstance(error, BaseExceptionGroup):  # noqa: F821
+        return [leaf for item in error.exceptions for leaf in leaves(item)]
+    return [error]
+
+
+def permanent(error: BaseException) -> bool:
+    """
+    Check if analysis fails the same way on retry: request rejected by the API, e.g. invalid or oversized.
+    """
+    return all(
+        isinstance(leaf, APIStatusError) and leaf.status_code < 500 and leaf.status_code not in TRANSIENT  # noqa: PLR2004
+        for leaf in leaves(error)
+    )
+
+
+def delay(attempts: int, options: Retry) -> timedelta:
+    """
+    Exponential backoff of the retry after `attempts` failures, with half of it jittered.
+    """
+    limit = min(options.maximum, options.backoff * 2 ** (attempts - 1))
+
+    return limit / 2 + limit / 2 * random.random()  # noqa: S311
+
+
+async def record(claim: CLAIM, error: BaseException, options: Retry) -> None:
+    """
+    Store failed attempt of the leased claim, dead-letter it after too many or permanent failures.
+    """
+    attempts = (claim.failure.attempts if claim.failure is not None else 0) + 1
+
+    leaf = leaves(error)[0]
+
+    failure = CLAIM.Failure(attempts=attempts, error=f"{type(leaf).__name__}: {leaf}"[:LENGTH])
+
+    if permanent(error) or attempts >= options.attempts:
+        failure.dead = True
+
+        logger.error("Claim %s analysis failed, attempts: %s, giving up", claim.ID, attempts, exc_info=error)
+
+    else:
+        failure.retry = datetime.now(timezone.utc) + delay(attempts, options)
+
+        logger.warning("Claim %s analysis failed, retry at %s", claim.ID, failure.retry, exc_info=error)
+
+    await CLAIM.find_one(CLAIM.ID == claim.ID).update({"$set": {"failure": failure}})
+
+
+async def requeue(*filters) -> int:
+    """
+    Retry dead-lettered claims matching `filters` as soon as possible, with attempts counted anew.
+
+    Returns
+    -------
+    int
+        Number of requeued claims.
+    """
+    result = await CLAIM.find(CLAIM.failure.dead == True, *filters).update(  # noqa: E712
+        {"$set": {"failure.attempts": 0, "failure.dead": False, "failure.retry": datetime.now(timezone.utc)}},
+    )
+
+    return result.modified_count
+
+
+async def due(interval: float) -> AsyncIterator[CLAIM.Brief]:
+    """
+    Yield claims, which retry time has come, every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        async for claim in intake.unprocessed(CLAIM.failure.retry <= datetime.now(timezone.utc)):
+            yield claim
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,225 @@
+"""
+Claims intake: discovery of OPEN claims for the analyzer.
+
+Change streams are used when available, so claims are picked up as soon as they
+become OPEN. Resume token is persisted after each event, thus restarted server
+continues from the last seen change. Standalone deployments fall back to polling.
+"""
+
+import asyncio
+import logging
+
+from typing import AsyncIterator
+from datetime import datetime, timezone
+
+from pymongo.errors import PyMongoError, OperationFailure
+from beanie.operators import Or
+from beanie.odm.queries.find import FindMany
+
+from ailabs.claims import metrics
+from ailabs.claims.database.models import CLAIM, CURSOR, RESULT
+
+
+__all__: tuple[str] = ("available", "batched", "poll", "unanalyzed", "unprocessed", "watch")
+
+
+NAME: str = "analyzer"
+
+# discovery cursor batch size
+BATCH: int = 500
+
+# https://www.mongodb.com/docs/manual/reference/error-codes/
+UNSUPPORTED: frozenset[int] = frozenset({40573})  # not a replica set
+INVALIDATED: frozenset[int] = frozenset({260, 280, 286})  # invalid resume token, history lost
+
+PIPELINE: list[dict] = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$in": ["insert", "replace"]}},
+                {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+            ],
+            "fullDocument.status": "OPEN",
+        },
+    },
+]
+
+
+def available(*filters) -> FindMany[CLAIM]:
+    """
+    Find OPEN claims, not leased, not in batch and not waiting for retry.
+    """
+    now = datetime.now(timezone.utc)
+
+    return CLAIM.find(
+        CLAIM.status == "OPEN",
+        CLAIM.batch == None,  # noqa: E711
+        Or(CLAIM.lease == None, CLAIM.lease.expires < now),  # noqa: E711
+        Or(CLAIM.failure == None, CLAIM.failure.retry <= now),  # noqa: E711
+        *filters,
+    )
+
+
+def unanalyzed() -> list[dict]:
+    """
+    Aggregation stages dropping claims which already have results.
+    """
+    return [
+        {
+            "$lookup": {
+                "from": RESULT.get_settings().name,
+                "localField": "ID",
+                "foreignField": "ID",
+                "pipeline": [{"$limit": 1}, {"$project": {"_id": 1}}],
+                "as": "results",
+            },
+        },
+        {"$match": {"results": {"$size": 0}}},
+    ]
+
+
+def unprocessed(*filters) -> AsyncIterator[CLAIM.Brief]:
+    """
+    Find OPEN claims without results, available for analysis, in a single query.
+
+    Additional `filters` are applied to claims before joining results.
+    """
+    query = available(*filters).aggregate(unanalyzed(), projection_model=CLAIM.Brief, batchSize=BATCH)
+
+    return metrics.timed("discovery", query)
+
+
+async def poll(interval: float) -> AsyncIterator[CLAIM.Brief]:
+    """
+    Yield all unprocessed claims every `interval` seconds.
+    """
+    while await asyncio.sleep(interval, True):
+        async for claim in unprocessed():
+            yield claim
+
+
+async def watch(interval: float) -> AsyncIterator[CLAIM | CLAIM.Brief]:
+    """
+    Yield claims as soon as they become OPEN.
+
+    All currently unprocessed claims are yielded first, including the ones seen by the
+    previous run but left unprocessed on shutdown, when the stream is resumed.
+    Claims may be yielded more than once, consumer is responsible for deduplication.
+    Database failures are logged and the stream is resumed after `interval` seconds.
+    """
+    cursor = await CURSOR.find_one(CURSOR.name == NAME)
+
+    token = cursor.token if cursor is not None else None
+
+    collection = CLAIM.get_motor_collection()
+
+    catchup = True
+
+    while True:
+        try:
+            if token is None:
+                # remember cluster time before catching up, so claims opened in between are not lost
+                reply = await collection.database.command("ping")
+
+                options = {"start_at_operation_time": reply.get("operationTime")}
+
+            else:
+                options = {"resume_after": token}
+
+            if catchup or token is None:
+                async for claim in unprocessed():
+                    yield claim
+
+                catchup = False
+
+            async with collection.watch(PIPELINE, full_document="updateLookup", **options) as stream:
+                logger.info("Watching claims change stream")
+
+                async for change in stream:
+                    yield CLAIM.model_validate(change["fullDocument"])
+
+                    token = stream.resume_token
+
+                    # upsert, instances starting together would both insert a new cursor otherwise
+                    await CURSOR.get_motor_collection().update_one(
+                        {"name": NAME},
+                        {"$set": {"token": token}},
+                        upsert=True,
+                    )
+
+        except PyMongoError as error:
+            code = error.code if isinstance(error, OperationFailure) else None
+
+            if code in UNSUPPORTED:
+                logger.warning("Change streams are not supported, polling every %s seconds", interval)
+
+                async for claim in poll(interval):
+                    yield claim
+
+                return
+
+            if code in INVALIDATED and token is not None:
+                logger.warning("Claims change stream can not be resumed, starting over")
+
+                token = None
+                continue
+
+            # connection losses, elections and the like pass
+            logger.error("Claims change stream failed, resuming in %s seconds", interval, exc_info=error)
+
+            await asyncio.sleep(interval)
+
+
+
+async def batched(
+    claims: AsyncIterator[CLAIM | CLAIM.Brief],
+    size: int,
+) -> AsyncIterator[list[CLAIM | CLAIM.Brief]]:
+    """
+    Group `claims` into lists of at most `size` ones, without waiting for more than already discovered.
+    """
+    # discovery runs ahead of the consumer by one group at most
+    queue: asyncio.Queue[CLAIM | CLAIM.Brief | None] = asyncio.Queue(size)
+
+    async def pump() -> Exception | None:
+        failure = None
+
+        try:
+            async for claim in claims:
+                await queue.put(claim)
+        except Exception as error:
+            failure = error
+
+        # wakes the consumer up at the end of discovery
+        await queue.put(None)
+
+        return failure
+
+    task = asyncio.create_task(pump())
+
+    try:
+        while True:
+            group = [await queue.get()]
+
+            while len(group) < size and not queue.empty():
+                group.append(queue.get_nowait())
+
+            if None in group:
+                group.remove(None)
+
+                if group:
+                    yield group
+
+                # discovery errors are raised to the consumer
+                if (failure := await task) is not None:
+                    raise failure
+
+                return
+
+            yield group
+
+    finally:
+        task.cancel()
+
+
+logger = logging.getLogger(__name__)
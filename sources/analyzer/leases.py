@@ -0,0 +1,133 @@
+"""
+Claims ownership between analyzer replicas.
+
+Claim is leased with a single find-and-modify, so only one replica processes it.
+Lease is renewed while the claim is processed; leases of crashed replicas expire
+and are taken over by others.
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+import contextlib
+
+from typing import AsyncIterator
+from datetime import datetime, timezone, timedelta
+
+from beanie import UpdateResponse
+from beanie.operators import Or
+
+from ailabs.claims.database.models import CLAIM
+
+from . import intake
+
+
+__all__: tuple[str] = ("OWNER", "acquire", "expired", "lease", "release", "renew")
+
+
+# identifier of this analyzer instance
+OWNER: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def acquire(claim: uuid.UUID, duration: timedelta) -> CLAIM | None:
+    """
+    Lease OPEN claim, if it is not leased by another instance, analyzed in batch or waiting for retry.
+
+    Returns
+    -------
+    CLAIM | None
+        Leased claim or None, if claim is not available.
+    """
+    now = datetime.now(timezone.utc)
+
+    return await CLAIM.find_one(
+        CLAIM.ID == claim,
+        CLAIM.status == "OPEN",
+        CLAIM.batch == None,  # noqa: E711
+        Or(
+            CLAIM.lease == None,  # noqa: E711
+            CLAIM.lease.owner == OWNER,
+            CLAIM.lease.expires < now,
+        ),
+        # dead-lettered claims have no retry time
+        Or(CLAIM.failure == None, CLAIM.failure.retry <= now),  # noqa: E711
+    ).update(
+        {"$set": {"lease": {"owner": OWNER, "expires": now + duration}}},
+        response_type=UpdateResponse.NEW_DOCUMENT,
+    )
+
+
+async def renew(claim: uuid.UUID, duration: timedelta) -> bool:
+    """
+    Extend lease owned by this instance.
+    """
+    result = await CLAIM.find_one(
+        CLAIM.ID == claim,
+        CLAIM.lease.owner == OWNER,
+    ).update(
+        {"$set": {"lease.expires": datetime.now(timezone.utc) + duration}},
+    )
+
+    return bool(result.modified_count)
+
+
+async def release(claim: uuid.UUID) -> None:
+    """
+    Drop lease owned by this instance.
+    """
+    await CLAIM.find_one(
+        CLAIM.ID == claim,
+        CLAIM.lease.owner == OWNER,
+    ).update(
+        {"$unset": {"lease": ""}},
+    )
+
+
+@contextlib.asynccontextmanager
+async def lease(claim: uuid.UUID, duration: timedelta) -> AsyncIterator[CLAIM | None]:
+    """
+    Hold claim lease while in context, renewing it in background.
+
+    Yields None if claim is not available.
+    """
+    if (leased := await acquire(claim, duration)) is None:
+        yield None
+        return
+
+    async def heartbeat() -> None:
+        while await asyncio.sleep(duration.total_seconds() / 3, True):
+            try:
+                if not await renew(claim, duration):
+                    logger.warning("Lease of claim %s is lost", claim)
+                    return
+            except Exception as error:
+                logger.warning("Failed to renew lease of claim %s", claim, exc_info=error)
+
+    task = asyncio.get_running_loop().create_task(heartbeat())
+
+    try:
+        yield leased
+
+    finally:
+        task.cancel()
+
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+        await release(claim)
+
+
+async def expired(duration: timedelta) -> AsyncIterator[CLAIM.Brief]:
+    """
+    Yield OPEN claims with expired leases every lease `duration`.
+
+    Such claims were abandoned by crashed instances and are not delivered by intake again.
+    """
+    while await asyncio.sleep(duration.total_seconds(), True):
+        async for claim in intake.unprocessed(CLAIM.lease.expires < datetime.now(timezone.utc)):
+            yield claim
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,212 @@
+"""
+Rules deciding claims before the model is asked.
+
+Rules are aggregation expressions over claim fields, evaluated by the database
+for all matching claims at once. Decided claims get results directly, so they
+never reach the model.
+"""
+
+import uuid
+import asyncio
+import logging
+
+from datetime import time, datetime, timezone
+from dataclasses import field, dataclass
+
+from ailabs.claims import stats, metrics
+from ailabs.claims.responses import RESPONSES
+from ailabs.claims.database.models import CLAIM, RESULT, DOCUMENT
+from ailabs.claims.settings.analyzer import Rules as Options
+
+from . import intake
+
+
+__all__: tuple[str] = ("Rule", "Rules")
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Claim decision applied when `condition` expression is true.
+    """
+
+    name: str
+
+    condition: dict
+
+    status: RESULT.Status
+
+    reason: RESULT.Reason
+
+    # aggregation stages adding fields the condition uses
+    stages: tuple[dict, ...] = field(default=())
+
+
+class Rules:
+    """
+    Ordered rules, the first matching one decides the claim.
+
+    Parameters
+    ----------
+    options : Options
+        Rules settings.
+    threshold : float
+        Amount threshold of the claim types without their own one.
+    """
+
+    def __init__(self, options: Options, threshold: float) -> None:
+        limit: float | dict = threshold
+
+        if options.thresholds:
+            limit = {
+                "$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$type", kind]}, "then": value} for kind, value in options.thresholds.items()
+                    ],
+                    "default": threshold,
+                },
+            }
+
+        self.rules: list[Rule] = [
+            Rule(
+                "quantity",
+                {"$or": [{"$lte": ["$quantity", 0]}, {"$lt": ["$amount", 0]}]},
+                RESULT.Status.REJECTED,
+                RESULT.Reason.NOT_ENOUTH_DATA,
+            ),
+        ]
+
+        if options.units:
+            self.rules.append(
+                Rule(
+                    "unit",
+                    {"$not": [{"$in": ["$unit", options.units]}]},
+                    RESULT.Status.REJECTED,
+                    RESULT.Reason.NOT_ENOUTH_DATA,
+                ),
+            )
+
+        self.rules += [
+            Rule(
+                "threshold",
+                {"$lt": ["$amount", limit]},
+                RESULT.Status.APPROVED,
+                RESULT.Reason.CLAIM_AMOUNT_BELOW_THRESHOLD,
+            ),
+            Rule(
+                "documents",
+                {
+                    "$and": [
+                        {"$eq": [{"$ifNull": ["$document", None]}, None]},
+                        {"$eq": [{"$size": {"$ifNull": ["$documents", []]}}, 0]},
+                        {"$eq": [{"$size": "$attached"}, 0]},
+                    ],
+                },
+                RESULT.Status.REJECTED,
+                RESULT.Reason.NOT_ENOUGH_DOCUMENTS,
+                # documents are attached to the claim by their own reference too, as analysis gathers them
+                (
+                    {
+                        "$lookup": {
+                            "from": DOCUMENT.get_settings().name,
+                            "localField": "ID",
+                            "foreignField": "claim",
+                            "pipeline": [{"$limit": 1}, {"$project": {"_id": 1}}],
+                            "as": "attached",
+                        },
+                    },
+                ),
+            ),
+        ]
+
+    def pipeline(self, token: str) -> list[dict]:
+        """
+        Aggregation stages storing results of the claims decided by rules, marked by sweep `token`.
+        """
+        branches = [
+            {"case": rule.condition, "then": {"status": rule.status.value, "reason": rule.reason.value}}
+            for rule in self.rules
+        ]
+
+        return [
+            *(stage for rule in self.rules for stage in rule.stages),
+            {"$project": {"_id": 0, "ID": 1, "decision": {"$switch": {"branches": branches, "default": None}}}},
+            {"$match": {"decision": {"$ne": None}}},
+            {
+                "$project": {
+                    "ID": 1,
+                    "status": "$decision.status",
+                    "reason": "$decision.reason",
+                    "sweep": {"$literal": token},
+                },
+            },
+            # unique index on results ID keeps results stored meanwhile
+            {
+                "$merge": {
+                    "into": RESULT.get_settings().name,
+                    "on": "ID",
+                    "whenMatched": "keepExisting",
+                    "whenNotMatched": "insert",
+                },
+            },
+        ]
+
+    async def apply(self, *filters) -> int:
+        """
+        Decide unprocessed claims matching `filters`, all of them if none given.
+
+        Returns number of the claims decided.
+        """
+        # $merge does not tell if anything is stored, results count does
+        collection, token = RESULT.get_motor_collection(), uuid.uuid4().hex
+
+        with metrics.stage("rules"):
+            count = await collection.estimated_document_count()
+            await intake.available(*filters).aggregate([*intake.unanalyzed(), *self.pipeline(token)]).to_list()
+
+        if await collection.estimated_document_count() == count:
+            return 0
+
+        today = datetime.combine(datetime.now(timezone.utc).date(), time(), timezone.utc)
+
+        # claims of the stored results are updated for exports, without reading them back
+        await RESULT.find(RESULT.sweep == token).aggregate(
+            [
+                {"$project": {"_id": 0, "ID": 1, "updated": {"$literal": today}}},
+                {
+                    "$merge": {
+                        "into": CLAIM.get_settings().name,
+                        "on": "ID",
+                        "whenMatched": "merge",
+                        "whenNotMatched": "discard",
+                    },
+                },
+            ],
+        ).to_list()
+
+        RESPONSES.changed()
+
+        stored = await RESULT.find(RESULT.sweep == token).aggregate(
+            [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        ).to_list()
+
+        await stats.record(
+            *(item for group in stored for item in stats.concluded(RESULT.Status(group["_id"]), group["count"])),
+        )
+
+        return sum(group["count"] for group in stored)
+
+    async def sweep(self, interval: float) -> None:
+        """
+        Decide all unprocessed claims every `interval` seconds.
+        """
+        while True:
+            try:
+                await self.apply()
+            except Exception as error:
+                logger.error("Failed to apply rules", exc_info=error)
+
+            await asyncio.sleep(interval)
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,142 @@
+"""
+Bounded pool of workers processing claims in priority order.
+"""
+
+import uuid
+import asyncio
+import logging
+import itertools
+
+from types import TracebackType
+from typing import Callable, Awaitable
+
+from ailabs.claims.database.models import CLAIM
+
+
+__all__: tuple[str] = ("PRIORITIES", "Scheduler")
+
+
+# queue sort keys, lower goes first
+PRIORITIES: dict[str, Callable[[CLAIM], tuple]] = {
+    "amount": lambda claim: (-claim.amount, claim.created),
+    "created": lambda claim: (claim.created, -claim.amount),
+}
+
+
+class Scheduler:
+    """
+    Runs `handler` for submitted claims with at most `workers` claims in flight.
+
+    Claims are deduplicated by `ID` until handled. When `backlog` claims are
+    waiting, `submit` blocks until a worker becomes available.
+
+    Parameters
+    ----------
+    handler : Callable[[CLAIM], Awaitable]
+        Coroutine function processing a single claim.
+    workers : int
+        Maximum number of concurrently processed claims.
+    backlog : int
+        Maximum number of queued claims.
+    priority : str
+        Name of the queue order, one of `PRIORITIES`.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[CLAIM], Awaitable],
+        *,
+        workers: int,
+        backlog: int,
+        priority: str,
+    ) -> None:
+        self.handler, self.key = handler, PRIORITIES[priority]
+
+        self.queue: asyncio.PriorityQueue[tuple[tuple, int, CLAIM]] = asyncio.PriorityQueue(backlog)
+
+        # queued and processed claims
+        self.pending: set[uuid.UUID] = set()
+
+        self.active: int = 0
+
+        self.workers: list[asyncio.Task] = []
+
+        self.size, self.counter = workers, itertools.count()
+
+        # no claims are taken while draining
+        self.draining: bool = False
+
+    def __contains__(self, claim: uuid.UUID) -> bool:
+        return claim in self.pending
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    async def __aenter__(self) -> "Scheduler":
+        loop = asyncio.get_running_loop()
+        self.workers = [loop.create_task(self.worker()) for _ in range(self.size)]
+        return self
+
+    async def __aexit__(
+        self,
+        exception: type[BaseException] | None,
+        value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    async def submit(self, claim: CLAIM) -> bool:
+        """
+        Enqueue claim, if it is not pending already.
+        """
+        if self.draining or claim.ID in self.pending:
+            return False
+
+        self.pending.add(claim.ID)
+
+        try:
+            await self.queue.put((self.key(claim), next(self.counter), claim))
+        except BaseException:
+            self.pending.discard(claim.ID)
+            raise
+
+        return True
+
+    async def drain(self) -> None:
+        """
+        Stop taking claims, drop queued ones and wait for the active ones to finish.
+
+        Dropped claims stay unprocessed, intake yields them again on the next start.
+        """
+        self.draining = True
+
+        while not self.queue.empty():
+            *_, claim = self.queue.get_nowait()
+
+            self.pending.discard(claim.ID)
+            self.queue.task_done()
+
+        logger.info("Draining analyzer, claims in flight: %s", self.active)
+
+        await self.queue.join()
+
+    async def worker(self) -> None:
+        while True:
+            *_, claim = await self.queue.get()
+
+            self.active += 1
+
+            try:
+                await self.handler(claim)
+            except Exception as error:
+                logger.error("Failed to process claim %s", claim.ID, exc_info=error)
+            finally:
+                self.active -= 1
+                self.pending.discard(claim.ID)
+                self.queue.task_done()
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,35 @@
+"""
+Analysis backends: providers answering the analysis requests.
+
+Implemented by `openai.OpenAI` and by the local `fake.Fake` for offline load tests.
+"""
+
+from typing import Callable, Protocol
+
+
+__all__: tuple[str] = ("Backend",)
+
+
+class Backend(Protocol):
+    """
+    Provider answering analysis requests with parsed JSON answers.
+    """
+
+    # model name, part of the answers cache key
+    model: str
+
+    async def complete(
+        self,
+        kind: str,
+        content: list[dict],
+        *,
+        tokens: int,
+        observe: Callable[[dict], bool] | None = None,
+    ) -> dict:
+        """
+        Answer analysis request of `kind` with user message `content`.
+
+        `tokens` is the estimated request cost. With `observe`, it is called with
+        the answer fields received so far, and the answer is stopped, if it returns True.
+        """
+        ...
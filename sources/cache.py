@@ -0,0 +1,99 @@
+"""
+Content-addressed cache of LLM answers persisted in the database.
+"""
+
+import hashlib
+import logging
+
+from typing import Any, Protocol
+from datetime import datetime, timezone, timedelta
+
+from ailabs.claims import metrics
+from ailabs.claims.database.models import CACHE
+
+
+__all__: tuple[str] = ("Cache", "Store")
+
+
+class Store(Protocol):
+    """
+    Storage of LLM answers by request key.
+    """
+
+    async def get(self, key: str) -> dict[str, Any] | None: ...
+
+    async def set(self, key: str, answer: dict[str, Any]) -> None: ...
+
+
+class Cache:
+    """
+    LLM answers cache keyed by hash of everything affecting the answer.
+
+    Entries expire after `ttl`; when more than `size` entries are stored,
+    the oldest ones are evicted. Hits and misses are exposed as metrics.
+
+    Parameters
+    ----------
+    ttl : timedelta
+        Lifetime of the cached answer.
+    size : int
+        Maximum number of cached answers.
+    """
+
+    def __init__(self, ttl: timedelta, size: int) -> None:
+        self.ttl, self.size = ttl, size
+
+    @staticmethod
+    def key(*parts: str | bytes) -> str:
+        """
+        Hash request parts, e.g. prompt, model, document bytes.
+        """
+        digest = hashlib.sha256()
+
+        for part in parts:
+            data = part.encode("utf-8") if isinstance(part, str) else part
+
+            # length prefix keeps parts boundaries
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry = await CACHE.find_one(CACHE.key == key, CACHE.expires > datetime.now(timezone.utc))
+
+        if entry is None:
+            metrics.CACHE.labels("miss").inc()
+            return None
+
+        metrics.CACHE.labels("hit").inc()
+
+        return entry.answer
+
+    async def set(self, key: str, answer: dict[str, Any]) -> None:
+        now = datetime.now(timezone.utc)
+
+        await CACHE.find_one(CACHE.key == key).upsert(
+            {"$set": {"answer": answer, "created": now, "expires": now + self.ttl}},
+            on_insert=CACHE(key=key, answer=answer, created=now, expires=now + self.ttl),
+        )
+
+        await self.evict()
+
+    async def evict(self) -> None:
+        """
+        Remove the oldest entries exceeding cache size.
+        """
+        collection = CACHE.get_motor_collection()
+
+        if (excess := await collection.estimated_document_count() - self.size) <= 0:
+            return
+
+        stale = collection.find({}, {"_id": True}).sort("created", 1).limit(excess)
+
+        result = await collection.delete_many({"_id": {"$in": [entry["_id"] async for entry in stale]}})
+
+        logger.debug("Evicted cached answers: %s", result.deleted_count)
+
+
+logger = logging.getLogger(__name__)
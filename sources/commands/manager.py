@@ -30,6 +30,7 @@ def callback(
             general=settings.General(),
             database=settings.database.Database(),
             integrations=settings.integrations.Integrations(),
+            analyzer=settings.analyzer.Analyzer(),
         )
 
     application = server.factory(config)
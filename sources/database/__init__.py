@@ -11,7 +11,7 @@ import logging
 from pathlib import Path
 
 from beanie import init_beanie
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo.errors import OperationFailure, ConnectionFailure, ServerSelectionTimeoutError
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from beanie.executors.migrate import MigrationSettings, run_migrate
 
@@ -20,7 +20,7 @@ from ailabs.claims.settings import database as settings
 from . import models
 
 
-__all__: tuple[str] = ("models",)
+__all__: tuple[str] = ("indexes", "models")
 
 
 async def initialize(config: settings.Database) -> AsyncIOMotorDatabase:
@@ -52,7 +52,8 @@ async def initialize(config: settings.Database) -> AsyncIOMotorDatabase:
     database = client[config.name]
 
     try:
-        await init_beanie(database, document_models=models.all())
+        # indexes are built by `indexes`, only the unique ones block startup
+        await init_beanie(database, document_models=models.all(), skip_indexes=True)
     except ServerSelectionTimeoutError:
         logger.error("Failed to initialize database: timed out")
 
@@ -78,7 +79,42 @@ async def initialize(config: settings.Database) -> AsyncIOMotorDatabase:
         )
     )
 
+    # migrations bind models they use to their own client, closed afterwards
+    await init_beanie(database, document_models=models.all(), skip_indexes=True)
+
+    # results deduplication and rules $merge rely on unique indexes
+    await indexes(unique=True)
+
     return client
 
 
+async def indexes(*, unique: bool = False) -> None:
+    """
+    Build `unique` or non-unique indexes declared by the models, missing ones only.
+
+    Builds of large collections take a while, so non-unique ones are built in background after startup.
+    Indexes which are not declared anymore are kept, they are to be dropped manually.
+    """
+    for model in models.all():
+        collection = model.get_motor_collection()
+
+        declared = [index for index in model.get_settings().indexes if index.document.get("unique", False) == unique]
+
+        if not declared:
+            continue
+
+        try:
+            names = await collection.create_indexes(declared)
+        except OperationFailure:
+            logger.error("Failed to build indexes of the %s collection", collection.name, exc_info=True)
+
+            # server must not run without them
+            if unique:
+                raise
+
+            continue
+
+        logger.info("Indexes of the %s collection are built: %s", collection.name, ", ".join(names))
+
+
 logger = logging.getLogger(__name__)
@@ -0,0 +1,106 @@
+"""
+Backfill statistics rollups of the claims and results stored before they were maintained.
+
+Rollups are rebuilt from scratch and replace the collection at once. Closing dates
+were not recorded, claims are counted as closed on their last update date.
+"""
+
+from beanie import free_fall_migration
+
+from ailabs.claims.stats import LONGEST
+from ailabs.claims.database.models import STAT, CLAIM, RESULT
+
+
+# milliseconds of a day, dates are stored at midnight
+DAY: int = 24 * 60 * 60 * 1000
+
+
+def rollup(kind: str, **fields) -> dict:
+    return {
+        "$project": {
+            "_id": 0,
+            "kind": {"$literal": kind},
+            "day": "$_id.day",
+            "status": {"$ifNull": ["$_id.status", ""]},
+            "type": {"$ifNull": ["$_id.type", ""]},
+            "bucket": {"$ifNull": ["$_id.bucket", 0]},
+            "total": 1,
+            "amount": {"$literal": 0.0},
+            "quantity": {"$literal": 0.0},
+            "days": {"$literal": 0},
+        }
+        | fields,
+    }
+
+
+CLAIMS: list[dict] = [
+    {
+        "$group": {
+            "_id": {"day": "$date", "status": "$status", "type": "$type"},
+            "total": {"$sum": 1},
+            "amount": {"$sum": "$amount"},
+            "quantity": {"$sum": "$quantity"},
+        },
+    },
+    rollup("claims", amount=1, quantity=1),
+]
+
+CLOSED: list[dict] = [
+    {"$match": {"status": "CLOSED"}},
+    {"$set": {"days": {"$toInt": {"$divide": [{"$subtract": ["$updated", "$created"]}, DAY]}}}},
+    {
+        "$group": {
+            "_id": {"day": "$updated", "bucket": {"$min": ["$days", LONGEST]}},
+            "total": {"$sum": 1},
+            "days": {"$sum": "$days"},
+        },
+    },
+    rollup("closed", days=1),
+]
+
+# results store no date, their identifiers do
+RESULTS: list[dict] = [
+    {"$set": {"stored": {"$toDate": "$_id"}}},
+    {
+        "$group": {
+            "_id": {
+                "day": {
+                    "$dateFromParts": {
+                        "year": {"$year": "$stored"},
+                        "month": {"$month": "$stored"},
+                        "day": {"$dayOfMonth": "$stored"},
+                    },
+                },
+                "status": "$status",
+            },
+            "total": {"$sum": 1},
+        },
+    },
+    rollup("results"),
+]
+
+
+class Forward:
+    # claims and results are read through the collection, declaring them would rebuild their indexes
+    @free_fall_migration(document_models=[STAT])
+    async def backfill(self, session) -> None:
+        database = STAT.get_motor_collection().database
+
+        # $out keeps indexes of the replaced collection
+        cursor = database[CLAIM.get_settings().name].aggregate(
+            [
+                *CLAIMS,
+                {"$unionWith": {"coll": CLAIM.get_settings().name, "pipeline": CLOSED}},
+                {"$unionWith": {"coll": RESULT.get_settings().name, "pipeline": RESULTS}},
+                {"$out": STAT.get_settings().name},
+            ],
+            session=session,
+        )
+
+        await cursor.to_list(None)
+
+
+class Backward:
+    @free_fall_migration(document_models=[STAT])
+    async def drop(self, session) -> None:
+        await STAT.delete_all(session=session)
@@ -1,14 +1,22 @@
 from beanie import Document
 
+from .stat import STAT
+from .batch import BATCH
+from .cache import CACHE
 from .claim import CLAIM
+from .cursor import CURSOR
 from .result import RESULT
 from .document import DOCUMENT
 
 
 __all__: tuple[str] = (
+    "BATCH",
+    "CACHE",
     "CLAIM",
-    "RESULT",
+    "CURSOR",
     "DOCUMENT",
+    "RESULT",
+    "STAT",
 )
 
 
@@ -0,0 +1,42 @@
+from typing import Annotated
+from datetime import datetime, timezone
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from pydantic import Field
+
+
+class BATCH(Document):
+    class Settings:
+        name = "batches"
+
+        validate_on_save = True
+
+        indexes = [  # noqa: RUF012
+            IndexModel([("ID", ASCENDING)], unique=True),
+            IndexModel([("status", ASCENDING)]),
+        ]
+
+    ID: Annotated[
+        str,
+        Field(description="Batch job identifier given by the provider."),
+    ]
+
+    status: Annotated[
+        str,
+        Field(description="Last known batch job status."),
+    ]
+
+    claims: Annotated[
+        dict[str, list[str]],
+        Field(description="Analysis kinds requested for each claim in the job, by claim identifier."),
+    ]
+
+    created: Annotated[
+        datetime,
+        Field(
+            default_factory=lambda: datetime.now(timezone.utc),
+            description="Time when the job was submitted.",
+        ),
+    ]
+
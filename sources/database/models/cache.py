@@ -0,0 +1,39 @@
+from typing import Any, Annotated
+from datetime import datetime
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from pydantic import Field
+
+
+class CACHE(Document):
+    class Settings:
+        name = "cache"
+
+        validate_on_save = True
+
+        indexes = [  # noqa: RUF012
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel([("created", ASCENDING)]),
+            IndexModel([("expires", ASCENDING)], expireAfterSeconds=0),
+        ]
+
+    key: Annotated[
+        str,
+        Field(description="Hash of the request content: prompt, model and documents."),
+    ]
+
+    answer: Annotated[
+        dict[str, Any],
+        Field(description="Parsed model answer."),
+    ]
+
+    created: Annotated[
+        datetime,
+        Field(description="Time when the answer was cached."),
+    ]
+
+    expires: Annotated[
+        datetime,
+        Field(description="Time when the answer is removed from the cache."),
+    ]
@@ -4,8 +4,8 @@ from typing import Literal, Annotated
 from datetime import date, datetime, timezone
 
 from beanie import Insert, Update, Document, before_event
-from pymongo import ASCENDING, IndexModel
-from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pydantic import Field, BaseModel
 
 
 class CLAIM(Document):
@@ -16,6 +16,17 @@ class CLAIM(Document):
 
         indexes = [  # noqa: RUF012
             IndexModel([("ID", ASCENDING)], unique=True),
+            # listing order of the keyset pagination
+            IndexModel([("created", DESCENDING), ("ID", DESCENDING)]),
+            # discovery of OPEN claims and listing by status
+            IndexModel([("status", ASCENDING), ("created", DESCENDING), ("ID", DESCENDING)]),
+            # listing by customer
+            IndexModel([("customer", ASCENDING), ("created", DESCENDING), ("ID", DESCENDING)]),
+            # incremental export
+            IndexModel([("updated", ASCENDING)]),
+            # claims waiting for retry and dead-lettered ones
+            IndexModel([("failure.retry", ASCENDING)], sparse=True),
+            IndexModel([("failure.dead", ASCENDING)], partialFilterExpression={"failure.dead": True}),
         ]
 
     ID: Annotated[
@@ -100,3 +111,71 @@ class CLAIM(Document):
         list[uuid.UUID],
         Field(description="References to related documents, such as images, invoices, or additional details."),
     ]
+
+    revision: Annotated[
+        int,
+        Field(description="Number of the claim changes, guards concurrent updates."),
+    ] = 0
+
+    class Lease(BaseModel):
+        owner: Annotated[
+            str,
+            Field(description="Identifier of the analyzer instance processing the claim."),
+        ]
+
+        expires: Annotated[
+            datetime,
+            Field(description="Time when the lease may be taken over by another instance."),
+        ]
+
+    lease: Annotated[
+        Lease | None,
+        Field(description="Analysis ownership of the claim, if any."),
+    ] = None
+
+    batch: Annotated[
+        str | None,
+        Field(description="Identifier of the batch job analyzing the claim, if any."),
+    ] = None
+
+    class Failure(BaseModel):
+        attempts: Annotated[
+            int,
+            Field(description="Number of failed analysis attempts."),
+        ]
+
+        error: Annotated[
+            str,
+            Field(description="Error of the last failed attempt."),
+        ]
+
+        retry: Annotated[
+            datetime | None,
+            Field(description="Time after which analysis is retried, None for dead-lettered claims."),
+        ] = None
+
+        dead: Annotated[
+            bool,
+            Field(description="Is analysis given up until the claim is requeued."),
+        ] = False
+
+    failure: Annotated[
+        Failure | None,
+        Field(description="Failed analysis attempts, if any."),
+    ] = None
+
+    checkpoint: Annotated[
+        dict[str, dict] | None,
+        Field(description="Model answers received by the interrupted analysis, by request key."),
+    ] = None
+
+    class Brief(BaseModel):
+        """
+        Projection of the fields required to schedule claim analysis.
+        """
+
+        ID: uuid.UUID
+
+        amount: float
+
+        created: date
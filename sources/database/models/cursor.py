@@ -0,0 +1,26 @@
+from typing import Any, Annotated
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from pydantic import Field
+
+
+class CURSOR(Document):
+    class Settings:
+        name = "cursors"
+
+        validate_on_save = True
+
+        indexes = [  # noqa: RUF012
+            IndexModel([("name", ASCENDING)], unique=True),
+        ]
+
+    name: Annotated[
+        str,
+        Field(description="Name of the change stream consumer."),
+    ]
+
+    token: Annotated[
+        dict[str, Any] | None,
+        Field(description="Resume token of the last processed change event."),
+    ] = None
@@ -1,8 +1,10 @@
 import uuid
 
+from typing import Literal
+
 from beanie import Document
 from pymongo import ASCENDING, IndexModel
-from pydantic import Field
+from pydantic import Field, BaseModel
 
 
 class DOCUMENT(Document):
@@ -13,6 +15,8 @@ class DOCUMENT(Document):
 
         indexes = [  # noqa: RUF012
             IndexModel([("ID", ASCENDING)], unique=True),
+            # documents of the claim
+            IndexModel([("claim", ASCENDING)]),
         ]
 
     ID: uuid.UUID = Field(default_factory=uuid.uuid4)
@@ -24,3 +28,38 @@ class DOCUMENT(Document):
     type: str
 
     data: bytes
+
+    class Image(BaseModel):
+        """
+        Downsized image sent to the vision model instead of the original.
+        """
+
+        type: str
+
+        data: bytes
+
+        width: int
+
+        height: int
+
+        detail: Literal["low", "high"]
+
+        # hash of preprocessing options the image was made with
+        options: str
+
+    image: Image | None = None
+
+    class Text(BaseModel):
+        """
+        Text extracted from the document, with images of the pages without text.
+        """
+
+        content: str
+
+        # resolved in the enclosing class namespace
+        pages: list["Image"]  # noqa: F821
+
+        # hash of extraction options the text was made with
+        options: str
+
+    text: Text | None = None
@@ -16,6 +16,8 @@ class RESULT(Document):
 
         indexes = [  # noqa: RUF012
             IndexModel([("ID", ASCENDING)], unique=True),
+            # results stored by the rules sweep, counted after it
+            IndexModel([("sweep", ASCENDING)], sparse=True),
         ]
 
     ID: Annotated[
@@ -48,6 +50,11 @@ class RESULT(Document):
         Field(description="Status change reason."),
     ] = None
 
+    sweep: Annotated[
+        str | None,
+        Field(description="Rules sweep stored the result, if decided by rules."),
+    ] = None
+
     relevant: Annotated[
         bool | None,
         Field(description="Are provided documents relevant to the claim."),
@@ -0,0 +1,73 @@
+from typing import Literal, Annotated
+from datetime import date
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from pydantic import Field
+
+
+class STAT(Document):
+    class Settings:
+        name = "stats"
+
+        validate_on_save = True
+
+        indexes = [  # noqa: RUF012
+            IndexModel(
+                [
+                    ("kind", ASCENDING),
+                    ("day", ASCENDING),
+                    ("status", ASCENDING),
+                    ("type", ASCENDING),
+                    ("bucket", ASCENDING),
+                ],
+                unique=True,
+            ),
+            IndexModel([("day", ASCENDING)]),
+        ]
+
+    kind: Annotated[
+        Literal["claims", "results", "closed"],
+        Field(description="Rolled up events: claims by status, stored results or closed claims."),
+    ]
+
+    day: Annotated[
+        date,
+        Field(description="Date the claims were submitted, or results stored, or claims closed."),
+    ]
+
+    status: Annotated[
+        str,
+        Field(description="Claims status or results status, empty for closed claims."),
+    ] = ""
+
+    type: Annotated[
+        str,
+        Field(description="Type of the claims, empty for results."),
+    ] = ""
+
+    bucket: Annotated[
+        int,
+        Field(description="Days from the claim creation to closing, the last bucket holds the longer ones."),
+    ] = 0
+
+    # `count` would shadow the document class method
+    total: Annotated[
+        int,
+        Field(description="Number of the claims or results."),
+    ] = 0
+
+    amount: Annotated[
+        float,
+        Field(description="Total monetary value of the claims."),
+    ] = 0.0
+
+    quantity: Annotated[
+        float,
+        Field(description="Total quantity of the claimed items."),
+    ] = 0.0
+
+    days: Annotated[
+        int,
+        Field(description="Total days to close of the closed claims."),
+    ] = 0
@@ -0,0 +1,114 @@
+"""
+Registry of the query shapes run against the database and their query plans.
+
+Each shape is built with representative values, explaining it tells whether
+indexes are used; collection scans mean the query cost grows with the collection.
+"""
+
+import uuid
+import logging
+
+from typing import Any, Callable
+from datetime import datetime, timezone
+from dataclasses import dataclass
+
+from beanie.operators import NotIn
+from beanie.odm.queries.find import FindMany
+from beanie.odm.queries.aggregation import AggregationQuery
+
+from ailabs.claims import listing
+from ailabs.claims.analyzer import batch, intake
+from ailabs.claims.database.models import STAT, BATCH, CACHE, CLAIM, RESULT, DOCUMENT
+
+
+__all__: tuple[str] = ("SHAPES", "Plan", "diagnose", "explain")
+
+
+Query = FindMany | AggregationQuery
+
+
+SHAPES: dict[str, Callable[[], Query]] = {
+    "claims.available": intake.available,
+    "claims.unprocessed": lambda: intake.available().aggregate(intake.unanalyzed()),
+    "claims.retries": lambda: intake.available(CLAIM.failure.retry <= datetime.now(timezone.utc)),
+    "claims.failed": lambda: CLAIM.find(CLAIM.failure.dead == True),  # noqa: E712
+    "claims.page": lambda: listing.page([], 101),
+    "claims.page.status": lambda: listing.page([CLAIM.status == "OPEN"], 101),
+    "claims.page.customer": lambda: listing.page([CLAIM.customer == uuid.uuid4()], 101),
+    "claims.export": lambda: CLAIM.find(CLAIM.updated >= datetime.now(timezone.utc).date()),
+    "results.claim": lambda: RESULT.find(RESULT.ID == uuid.uuid4()),
+    "documents.claim": lambda: DOCUMENT.find(DOCUMENT.claim == uuid.uuid4()),
+    "batches.running": lambda: BATCH.find(NotIn(BATCH.status, batch.FINISHED)),
+    "stats.period": lambda: STAT.find(STAT.day >= datetime.now(timezone.utc).date()),
+    "cache.key": lambda: CACHE.find(CACHE.key == "", CACHE.expires > datetime.now(timezone.utc)),
+}
+
+
+@dataclass
+class Plan:
+    name: str
+
+    collection: str
+
+    stages: list[str]
+
+    # collection is scanned as a whole
+    scan: bool
+
+
+def stages(plan: Any) -> list[str]:
+    """
+    Collect stages of the winning plans found anywhere in the explain reply.
+    """
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in stages(item)]
+
+    if not isinstance(plan, dict):
+        return []
+
+    found = [plan["stage"]] if isinstance(plan.get("stage"), str) else []
+
+    return found + [
+        stage for key, value in plan.items() if key not in {"rejectedPlans", "command"} for stage in stages(value)
+    ]
+
+
+async def explain(name: str, query: Query) -> Plan:
+    """
+    Explain the query planner choice for the `query`, without running it.
+    """
+    collection = query.document_model.get_motor_collection()
+
+    if isinstance(query, AggregationQuery):
+        command = {"aggregate": collection.name, "pipeline": query.get_aggregation_pipeline(), "cursor": {}}
+
+    else:
+        command = {"find": collection.name, "filter": query.get_filter_query()}
+
+        if query.sort_expressions:
+            command["sort"] = {field: int(direction) for field, direction in query.sort_expressions}
+
+        if query.limit_number:
+            command["limit"] = query.limit_number
+
+    reply = await collection.database.command({"explain": command, "verbosity": "queryPlanner"})
+
+    found = stages(reply)
+
+    return Plan(name=name, collection=collection.name, stages=found, scan="COLLSCAN" in found)
+
+
+async def diagnose() -> list[Plan]:
+    """
+    Explain all registered query shapes, warning about collection scans.
+    """
+    plans = [await explain(name, shape()) for name, shape in SHAPES.items()]
+
+    for plan in plans:
+        if plan.scan:
+            logger.warning("Query %s scans the %s collection", plan.name, plan.collection)
+
+    return plans
+
+
+logger = logging.getLogger(__name__)
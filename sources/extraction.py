@@ -0,0 +1,153 @@
+"""
+Text extraction from PDF and DOCX documents.
+
+Extracted text is analyzed with a text-only prompt, far cheaper than vision;
+only scanned pages without text are rendered and sent as images. Results are
+stored next to the original document.
+"""
+
+import io
+import asyncio
+import hashlib
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+
+from concurrent.futures import Executor
+
+import pypdfium2
+
+from ailabs.claims import images
+from ailabs.claims.database.models import DOCUMENT
+from ailabs.claims.settings.analyzer import Images, Extraction
+
+
+__all__: tuple[str] = ("docx", "kind", "pdf", "prepare")
+
+
+PDF: str = "application/pdf"
+
+DOCX: str = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# https://learn.microsoft.com/en-us/dotnet/api/documentformat.openxml.wordprocessing
+WORDML: str = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def kind(document: DOCUMENT) -> str | None:
+    """
+    Get extractable document type by content type or file name, as browsers often send none.
+    """
+    name = document.name.lower()
+
+    if document.type == PDF or name.endswith(".pdf"):
+        return PDF
+
+    if document.type == DOCX or name.endswith(".docx"):
+        return DOCX
+
+    return None
+
+
+def pdf(data: bytes, extraction: Extraction, options: Images) -> tuple[str, list[tuple[bytes, int, int]]]:
+    """
+    Extract PDF text and render pages without it; runs in a worker process.
+
+    Returns
+    -------
+    tuple[str, list[tuple[bytes, int, int]]]
+        Text of all pages and encoded images of the scanned ones with their sizes.
+    """
+    texts, pages = [], []
+
+    document = pypdfium2.PdfDocument(data)
+
+    try:
+        for page in document:
+            textpage = page.get_textpage()
+
+            try:
+                text = textpage.get_text_range().strip()
+            finally:
+                textpage.close()
+
+            if len(text) >= extraction.minimum:
+                texts.append(text)
+
+            elif len(pages) < extraction.pages:
+                image = page.render(scale=extraction.dpi / 72).to_pil()
+
+                pages.append(images.fit(image, options.resolution, options.shortest, options.format, options.quality))
+
+            page.close()
+
+    finally:
+        document.close()
+
+    return "\n\n".join(texts), pages
+
+
+def docx(data: bytes, extraction: Extraction, options: Images) -> tuple[str, list[tuple[bytes, int, int]]]:  # noqa: ARG001
+    """
+    Extract DOCX paragraphs text; runs in a worker process.
+
+    Returns
+    -------
+    tuple[str, list[tuple[bytes, int, int]]]
+        Text of the document body, DOCX has no pages to render.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ET.fromstring(archive.read("word/document.xml"))  # noqa: S314
+
+    paragraphs = [
+        "".join(node.text or "" for node in paragraph.iter(f"{WORDML}t")) for paragraph in root.iter(f"{WORDML}p")
+    ]
+
+    return "\n".join(filter(None, paragraphs)), []
+
+
+async def prepare(documents: list[DOCUMENT], extraction: Extraction, options: Images, executor: Executor) -> None:
+    """
+    Attach extracted text to the PDF and DOCX documents, missing ones are made in `executor`.
+    """
+    loop = asyncio.get_running_loop()
+
+    signature = hashlib.sha256(
+        extraction.model_dump_json(exclude={"enabled"}).encode()
+        + options.model_dump_json(exclude={"enabled", "processes"}).encode(),
+    ).hexdigest()
+
+    async def single(document: DOCUMENT) -> None:
+        if (extractor := {PDF: pdf, DOCX: docx}.get(kind(document))) is None:
+            return
+
+        if document.text is not None and document.text.options == signature:
+            return
+
+        try:
+            text, pages = await loop.run_in_executor(executor, extractor, document.data, extraction, options)
+        except Exception as error:
+            logger.warning("Failed to extract document %s text", document.ID, exc_info=error)
+            return
+
+        document.text = DOCUMENT.Text(
+            content=text[: extraction.characters],
+            pages=[
+                DOCUMENT.Image(
+                    type=f"image/{options.format.lower()}",
+                    data=data,
+                    width=width,
+                    height=height,
+                    detail=images.detail(width, height, options.detail),
+                    options=signature,
+                )
+                for data, width, height in pages
+            ],
+            options=signature,
+        )
+
+        await DOCUMENT.find_one(DOCUMENT.ID == document.ID).update({"$set": {"text": document.text}})
+
+    await asyncio.gather(*map(single, documents))
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,94 @@
+"""
+Local fake analysis backend for load tests without paid calls.
+"""
+
+import math
+import random
+import asyncio
+import logging
+
+from typing import Callable
+
+from ailabs.claims.cache import Cache
+from ailabs.claims.settings.analyzer import Fake as Options
+
+
+__all__: tuple[str] = ("Failure", "Fake")
+
+
+DEPARTMENTS: tuple[str, ...] = ("Logistics", "Quality", "Sales", "Finance")
+
+DAMAGES: tuple[str, ...] = ("scratches", "dents", "broken packaging", "water damage", "no visible damage")
+
+
+class Failure(Exception):  # noqa: N818
+    """
+    Simulated backend failure.
+    """
+
+
+class Fake:
+    """
+    Backend answering with schema-valid random answers after a random delay.
+
+    Answers, delays and failures are deterministic for the same request and seed,
+    latency is log-normally distributed around the configured median.
+
+    Parameters
+    ----------
+    options : Options
+        Fake backend settings.
+    model : str
+        Model name reported to the answers cache, must differ from the real models ones.
+    """
+
+    def __init__(self, options: Options, model: str = "fake") -> None:
+        self.options, self.model = options, model
+
+    def answer(self, kind: str, generator: random.Random) -> dict:
+        if kind == "document":
+            return {
+                "relevant": generator.random() < self.options.relevant,
+                "material": generator.choice([None, generator.randint(100000, 999999)]),
+                "summary": f"Fake document summary #{generator.randint(1, 1000)}",
+            }
+
+        return {
+            "description": f"Fake photos description #{generator.randint(1, 1000)}",
+            "department": generator.choice(DEPARTMENTS),
+            "damage": {
+                "factor": round(generator.random(), 2),
+                "damage": generator.choice(DAMAGES),
+            },
+        }
+
+    async def complete(
+        self,
+        kind: str,
+        content: list[dict],
+        *,
+        tokens: int,
+        observe: Callable[[dict], bool] | None = None,
+    ) -> dict:
+        texts = [part["text"] for part in content if part["type"] == "text"]
+
+        generator = random.Random(Cache.key(str(self.options.seed), kind, *texts, str(tokens)))  # noqa: S311
+
+        if self.options.latency > 0:
+            await asyncio.sleep(generator.lognormvariate(math.log(self.options.latency), self.options.sigma))
+
+        if generator.random() < self.options.errors:
+            message = f"Simulated {kind} analysis failure"
+            raise Failure(message)
+
+        answer = self.answer(kind, generator)
+
+        if observe is not None:
+            observe(answer)
+
+        logger.debug("Fake %s answer: %s", kind, answer)
+
+        return answer
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,122 @@
+"""
+Images preprocessing before sending them to the vision model.
+
+Images are downsized as the vision model would do it anyway, re-encoded
+without metadata, and stored next to the original document.
+"""
+
+import io
+import asyncio
+import hashlib
+import logging
+
+from concurrent.futures import Executor
+
+from PIL import Image, ImageOps
+
+from ailabs.claims.database.models import DOCUMENT
+from ailabs.claims.settings.analyzer import Images
+
+
+__all__: tuple[str] = ("detail", "fit", "prepare", "shrink")
+
+
+# side of the vision model tile, images fitting into one can use low detail
+TILE: int = 512
+
+
+def fit(image: Image.Image, resolution: int, shortest: int, format: str, quality: int) -> tuple[bytes, int, int]:  # noqa: A002
+    """
+    Downsize and encode image without metadata.
+
+    Returns
+    -------
+    tuple[bytes, int, int]
+        Encoded image, its width and height.
+    """
+    image.thumbnail((resolution, resolution), Image.Resampling.LANCZOS)
+
+    if (scale := shortest / min(image.size)) < 1:
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.Resampling.LANCZOS,
+        )
+
+    if image.mode not in {"RGB", "L"}:
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+
+    # metadata is not copied unless passed explicitly
+    image.save(buffer, format=format, quality=quality, optimize=True)
+
+    return buffer.getvalue(), image.width, image.height
+
+
+def shrink(data: bytes, resolution: int, shortest: int, format: str, quality: int) -> tuple[bytes, int, int]:  # noqa: A002
+    """
+    Downsize and re-encode image; runs in a worker process.
+
+    Returns
+    -------
+    tuple[bytes, int, int]
+        Encoded image, its width and height.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # apply orientation before metadata is dropped
+        return fit(ImageOps.exif_transpose(source), resolution, shortest, format, quality)
+
+
+def detail(width: int, height: int, option: str) -> str:
+    """
+    Select vision detail level, "auto" is "low" for images fitting into a single tile.
+    """
+    if option == "auto":
+        return "low" if max(width, height) <= TILE else "high"
+    return option
+
+
+async def prepare(documents: list[DOCUMENT], options: Images, executor: Executor) -> None:
+    """
+    Attach downsized images to the image documents, missing ones are made in `executor`.
+    """
+    loop = asyncio.get_running_loop()
+
+    signature = hashlib.sha256(options.model_dump_json(exclude={"enabled", "processes"}).encode()).hexdigest()
+
+    async def single(document: DOCUMENT) -> None:
+        if not document.type.startswith("image"):
+            return
+
+        if document.image is not None and document.image.options == signature:
+            return
+
+        try:
+            data, width, height = await loop.run_in_executor(
+                executor,
+                shrink,
+                document.data,
+                options.resolution,
+                options.shortest,
+                options.format,
+                options.quality,
+            )
+        except Exception as error:
+            logger.warning("Failed to preprocess document %s, original is used", document.ID, exc_info=error)
+            return
+
+        document.image = DOCUMENT.Image(
+            type=f"image/{options.format.lower()}",
+            data=data,
+            width=width,
+            height=height,
+            detail=detail(width, height, options.detail),
+            options=signature,
+        )
+
+        await DOCUMENT.find_one(DOCUMENT.ID == document.ID).update({"$set": {"image": document.image}})
+
+    await asyncio.gather(*map(single, documents))
+
+
+logger = logging.getLogger(__name__)
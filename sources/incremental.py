@@ -0,0 +1,86 @@
+"""
+Incremental parsing of JSON objects received in chunks, e.g. streamed LLM answers.
+"""
+
+import json
+
+from typing import Any
+
+
+__all__: tuple[str] = ("Parser",)
+
+
+class Parser:
+    """
+    Incremental parser of the top-level JSON object fields.
+
+    Each field is available in `fields` as soon as its value is complete,
+    before the whole document is received.
+    """
+
+    def __init__(self) -> None:
+        self.text: str = ""
+
+        self.fields: dict[str, Any] = {}
+
+        self.depth: int = 0
+
+        self.string: bool = False
+
+        self.escape: bool = False
+
+        # offset of the current top-level field
+        self.segment: int = 0
+
+    def feed(self, text: str) -> None:
+        start, self.text = len(self.text), self.text + text
+
+        for index in range(start, len(self.text)):
+            char = self.text[index]
+
+            if self.string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.string = False
+
+            elif char == '"':
+                self.string = True
+
+            elif char in "{[":
+                self.depth += 1
+
+                if self.depth == 1:
+                    self.segment = index + 1
+
+            elif char in "}]":
+                self.depth -= 1
+
+                if self.depth == 0:
+                    self.complete(index)
+
+            elif char == "," and self.depth == 1:
+                self.complete(index)
+
+                self.segment = index + 1
+
+    def complete(self, end: int) -> None:
+        """
+        Parse top-level field ending at `end` offset.
+        """
+        if not (segment := self.text[self.segment : end]).strip():
+            return
+
+        try:
+            self.fields.update(json.loads(f"{{{segment}}}"))
+        except ValueError:
+            # invalid document is reported by `result`
+            pass
+
+    def result(self) -> Any:
+        """
+        Parse the whole received document.
+        """
+        return json.loads(self.text)
@@ -0,0 +1,120 @@
+"""
+Client-side requests and tokens rate limiting for LLM calls.
+"""
+
+import re
+import time
+import asyncio
+import logging
+
+from typing import Mapping
+
+
+__all__: tuple[str] = ("Limiter", "duration")
+
+
+DURATION: re.Pattern = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+UNITS: dict[str, float] = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def duration(value: str) -> float:
+    """
+    Parse rate limit reset duration, like `6m0s` or `20ms`, to seconds.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(amount) * UNITS[unit] for amount, unit in DURATION.findall(value))
+
+
+class Limiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by all LLM calls.
+
+    Both budgets are token buckets refilled continuously; calls wait in FIFO order
+    until they fit. Limits are adjusted from `x-ratelimit-*` response headers, and
+    429 answers pause all calls for the requested time.
+
+    Parameters
+    ----------
+    rpm : int
+        Requests per minute.
+    tpm : int
+        Tokens per minute.
+    """
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.limits: dict[str, float] = {"requests": float(rpm), "tokens": float(tpm)}
+
+        self.available: dict[str, float] = self.limits.copy()
+
+        self.updated: float = time.monotonic()
+
+        # no calls allowed until this time
+        self.paused: float = 0.0
+
+        self.lock = asyncio.Lock()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+
+        elapsed, self.updated = now - self.updated, now
+
+        for key, limit in self.limits.items():
+            self.available[key] = min(limit, self.available[key] + elapsed * limit / 60.0)
+
+    def delay(self, tokens: float) -> float:
+        """
+        Seconds to wait until a call of `tokens` cost fits into the budget.
+        """
+        self.refill()
+
+        delays = [self.paused - time.monotonic()]
+
+        for key, cost in (("requests", 1.0), ("tokens", min(tokens, self.limits["tokens"]))):
+            if (deficit := cost - self.available[key]) > 0:
+                delays.append(deficit * 60.0 / self.limits[key])
+
+        return max(delays)
+
+    async def acquire(self, tokens: float) -> None:
+        """
+        Wait until the call fits into the budget and reserve it.
+        """
+        async with self.lock:
+            while (delay := self.delay(tokens)) > 0:
+                logger.debug("Rate limit reached, waiting %.2f seconds", delay)
+                await asyncio.sleep(delay)
+
+            self.available["requests"] -= 1.0
+            self.available["tokens"] -= min(tokens, self.limits["tokens"])
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """
+        Adjust budget with actual limits reported by the server.
+        """
+        self.refill()
+
+        for key in self.limits:
+            if (limit := headers.get(f"x-ratelimit-limit-{key}")) is not None:
+                self.limits[key] = float(limit)
+
+            if (remaining := headers.get(f"x-ratelimit-remaining-{key}")) is not None:
+                self.available[key] = min(self.available[key], float(remaining))
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Pause all calls after the server rejected one.
+        """
+        self.refill()
+
+        self.paused = max(self.paused, time.monotonic() + seconds)
+
+        # server-side budget is exhausted
+        self.available = dict.fromkeys(self.available, 0.0)
+
+        logger.warning("Rate limit exceeded, calls paused for %.2f seconds", seconds)
+
+
+logger = logging.getLogger(__name__)
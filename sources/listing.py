@@ -0,0 +1,41 @@
+"""
+Claims listing queries, shared by claim reads and query plans diagnostics.
+"""
+
+import logging
+
+from pymongo import DESCENDING
+from pydantic import BaseModel
+from beanie.odm.queries.aggregation import AggregationQuery
+
+from ailabs.claims.database.models import CLAIM, RESULT
+
+
+__all__: tuple[str] = ("JOIN", "page")
+
+
+# joins analysis result to the claim, if any
+JOIN: list[dict] = [
+    {"$lookup": {"from": RESULT.get_settings().name, "localField": "ID", "foreignField": "ID", "as": "result"}},
+    {"$set": {"result": {"$arrayElemAt": ["$result", 0]}}},
+]
+
+
+def page(filters: list, limit: int, projection: type[BaseModel] | None = None) -> AggregationQuery:
+    """
+    Claims page in the listing order with results joined in the same round trip.
+
+    Stages are set explicitly, `FindMany.aggregate` would join results before sorting and limiting.
+    """
+    return CLAIM.aggregate(
+        [
+            {"$match": CLAIM.find(*filters).get_filter_query()},
+            {"$sort": {"created": DESCENDING, "ID": DESCENDING}},
+            {"$limit": limit},
+            *JOIN,
+        ],
+        projection_model=projection,
+    )
+
+
+logger = logging.getLogger(__name__)
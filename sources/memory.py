@@ -0,0 +1,57 @@
+"""
+Memory budget of documents held by concurrently analyzed claims.
+"""
+
+import asyncio
+import logging
+import contextlib
+
+from typing import AsyncIterator
+
+
+__all__: tuple[str] = ("Budget",)
+
+
+class Budget:
+    """
+    Bytes of documents which may be loaded at once, shared by all analyzer workers.
+
+    Reservations exceeding the whole budget are capped to it, so such claims
+    are still analyzed, just alone.
+
+    Parameters
+    ----------
+    limit : int
+        Budget size in bytes.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = self.available = limit
+
+        self.condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, size: int) -> AsyncIterator[None]:
+        """
+        Wait until `size` bytes are available and hold them within the context.
+        """
+        size = min(size, self.limit)
+
+        async with self.condition:
+            if size > self.available:
+                logger.debug("Memory budget exhausted, waiting for %s bytes", size)
+
+            await self.condition.wait_for(lambda: size <= self.available)
+
+            self.available -= size
+
+        try:
+            yield
+
+        finally:
+            async with self.condition:
+                self.available += size
+                self.condition.notify_all()
+
+
+logger = logging.getLogger(__name__)
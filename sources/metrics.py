@@ -0,0 +1,98 @@
+"""
+Prometheus metrics of the analyzer and the HTTP server.
+
+Exposed by the `/metrics` endpoint in the text exposition format.
+"""
+
+import time
+import contextlib
+
+from typing import TypeVar, Iterator, AsyncIterable, AsyncIterator
+
+from prometheus_client import Gauge, Counter, Histogram
+
+
+__all__: tuple[str] = ("ACTIVE", "CACHE", "QUEUE", "REQUESTS", "RESULTS", "STAGES", "TOKENS", "stage", "timed")
+
+
+T = TypeVar("T")
+
+
+# from 5ms to 2min, LLM calls take seconds while database queries take milliseconds
+BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGES = Histogram(
+    "claims_analyzer_stage_seconds",
+    "Duration of the analyzer stages.",
+    ["stage"],
+    buckets=BUCKETS,
+)
+
+QUEUE = Gauge(
+    "claims_analyzer_queue_depth",
+    "Claims waiting for an analyzer worker.",
+)
+
+ACTIVE = Gauge(
+    "claims_analyzer_in_flight",
+    "Claims being analyzed.",
+)
+
+RESULTS = Counter(
+    "claims_analyzer_results_total",
+    "Stored analysis results.",
+    ["status", "reason"],
+)
+
+TOKENS = Counter(
+    "claims_analyzer_tokens_total",
+    "Tokens used by the model.",
+    ["type"],
+)
+
+CACHE = Counter(
+    "claims_analyzer_cache_total",
+    "Lookups of the LLM answers cache.",
+    ["result"],
+)
+
+REQUESTS = Histogram(
+    "claims_http_request_seconds",
+    "Duration of the HTTP requests.",
+    ["method", "route", "status"],
+    buckets=BUCKETS,
+)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Observe duration of the analyzer stage within the context.
+    """
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        STAGES.labels(name).observe(time.perf_counter() - start)
+
+
+async def timed(name: str, items: AsyncIterable[T]) -> AsyncIterator[T]:
+    """
+    Yield `items` observing time spent waiting for them only, not the consumer time.
+    """
+    spent, iterator = 0.0, items.__aiter__()
+
+    while True:
+        start = time.perf_counter()
+
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            spent += time.perf_counter() - start
+
+        yield item
+
+    STAGES.labels(name).observe(spent)
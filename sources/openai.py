@@ -1,13 +1,43 @@
 import json
+import math
+import uuid
+import asyncio
 import logging
+import itertools
+import contextlib
 
 from base64 import b64encode
+from typing import Callable, Iterator, AsyncIterator
 from pathlib import Path
+from dataclasses import dataclass
 
-from openai import OpenAI
+import httpx
 
-from ailabs.claims.database.models import CLAIM, RESULT, DOCUMENT
+from openai import AsyncOpenAI, APIStatusError, RateLimitError, InternalServerError
 
+from ailabs.claims import metrics
+from ailabs.claims.cache import Cache, Store
+from ailabs.claims.limiter import Limiter, duration
+from ailabs.claims.backends import Backend
+from ailabs.claims.incremental import Parser
+from ailabs.claims.database.models import CLAIM, DOCUMENT
+
+
+MODEL: str = "gpt-4-turbo"
+
+MAX_TOKENS: int = 800
+
+# attempts of a rate limited call
+ATTEMPTS: int = 3
+
+# vision cost: base tokens plus tokens per 512px tile, up to 8 tiles for high detail
+IMAGE_TOKENS: tuple[int, int, int] = (85, 170, 8)
+
+# approximate size of the encoded 512px image tile
+TILE_BYTES: int = 48 * 1024
+
+# documents are base64-encoded by chunks of this size, a multiple of 3 keeps them concatenable
+CHUNK: int = 3 * 64 * 1024
 
 RESTRICTION: str = """
 Do NOT include anything besides valid JSON in your answer.
@@ -78,98 +108,492 @@ Give a JSON output with following structure:
 # """
 
 
-def analyze(
-    client: OpenAI,
-    claim: CLAIM,
-    document: DOCUMENT,
-    documents: list[DOCUMENT],
-) -> RESULT:
-    if document is not None and not document.type.startswith("image"):
+def payload(document: DOCUMENT) -> tuple[str, bytes]:
+    """
+    Get content type and data sent for the document: preprocessed image, if any.
+    """
+    if document.image is not None:
+        return document.image.type, document.image.data
+    return document.type, document.data
+
+
+@dataclass(frozen=True, slots=True)
+class Inline:
+    """
+    Document data URL, encoded only while the request body is serialized.
+    """
+
+    type: str
+
+    data: bytes
+
+
+def inline(kind: str, data: bytes, detail: str | None = None) -> dict:
+    """
+    Make message content part with the image inlined as data URL.
+    """
+    part = {
+        "type": "image_url",
+        "image_url": {
+            "url": Inline(kind, data),
+        },
+    }
+
+    if detail is not None:
+        part["image_url"]["detail"] = detail
+
+    return part
+
+
+def image(document: DOCUMENT) -> dict:
+    """
+    Make message content part with the document inlined as data URL.
+    """
+    return inline(*payload(document), document.image.detail if document.image is not None else None)
+
+
+def supported(document: DOCUMENT) -> bool:
+    """
+    Check if document can be analyzed: an image or a document with extracted text or pages.
+    """
+    if document.type.startswith("image"):
+        return True
+    return document.text is not None and bool(document.text.content or document.text.pages)
+
+
+def parts(document: DOCUMENT) -> list[dict]:
+    """
+    Make message content parts of the document: extracted text and scanned pages, or the image itself.
+    """
+    if document.text is None:
+        return [image(document)]
+
+    pages = [inline(page.type, page.data, page.detail) for page in document.text.pages]
+
+    if not document.text.content:
+        return pages
+
+    return [{"type": "text", "text": f"Document {document.name}:\n\n{document.text.content}"}, *pages]
+
+
+def estimate(text: str, documents: list[DOCUMENT]) -> int:
+    """
+    Estimate tokens counted against the rate limit: prompt, documents and completion.
+
+    Tiles of preprocessed images are counted exactly, otherwise estimated by size.
+    """
+    base, tile, tiles = IMAGE_TOKENS
+
+    def vision(image: DOCUMENT.Image) -> int:
+        if image.detail == "low":
+            return base
+        return base + tile * math.ceil(image.width / 512) * math.ceil(image.height / 512)
+
+    images = 0
+
+    for document in documents:
+        if document.text is not None:
+            images += len(document.text.content) // 4 + sum(map(vision, document.text.pages))
+        elif document.image is None:
+            images += base + tile * min(tiles, math.ceil(len(document.data) / TILE_BYTES))
+        else:
+            images += vision(document.image)
+
+    return len(text) // 4 + images + MAX_TOKENS
+
+
+def serialize(body: dict) -> tuple[int, Iterator[bytes]]:
+    """
+    Serialize request body to JSON, inlined documents are base64-encoded chunk by chunk.
+
+    Only a single chunk of encoded data exists at a time, instead of the encoded
+    copies of all documents and the whole serialized body.
+
+    Returns
+    -------
+    tuple[int, Iterator[bytes]]
+        Body length and its chunks.
+    """
+    inlined: list[Inline] = []
+
+    # stands for the inlined documents in the serialized body
+    marker = uuid.uuid4().hex
+
+    def placeholder(item: object) -> str:
+        if not isinstance(item, Inline):
+            message = f"Object of type {type(item).__name__} is not JSON serializable"
+            raise TypeError(message)
+
+        inlined.append(item)
+
+        return marker
+
+    parts = json.dumps(body, default=placeholder).encode("utf-8").split(f'"{marker}"'.encode())
+
+    prefixes = [f'"data:{item.type};base64,'.encode() for item in inlined]
+
+    # base64 length is known upfront, closing quotes included
+    encoded = (len(prefix) + 4 * math.ceil(len(item.data) / 3) + 1 for prefix, item in zip(prefixes, inlined))
+
+    size = sum(map(len, parts)) + sum(encoded)
+
+    def chunks() -> Iterator[bytes]:
+        for part, prefix, item in itertools.zip_longest(parts, prefixes, inlined):
+            yield part
+
+            if item is None:
+                continue
+
+            yield prefix
+
+            view = memoryview(item.data)
+
+            for start in range(0, len(view), CHUNK):
+                yield b64encode(view[start : start + CHUNK])
+
+            yield b'"'
+
+    return size, chunks()
+
+
+@contextlib.asynccontextmanager
+async def send(client: AsyncOpenAI, http: httpx.AsyncClient, body: dict) -> AsyncIterator[httpx.Response]:
+    """
+    Post chat completion request streaming its body, raise API errors as the client does.
+
+    Response body is read within the context, it is closed on exit.
+    """
+    size, chunks = serialize(body)
+
+    async def stream() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+
+    # unset optional headers are Omit sentinels, recent SDKs carry authorization separately
+    headers = {
+        key: value for key, value in {**client.default_headers, **client.auth_headers}.items() if isinstance(value, str)
+    }
+
+    request = http.build_request(
+        "POST",
+        client.base_url.join("chat/completions"),
+        content=stream(),
+        headers=headers | {"Content-Length": str(size)},
+    )
+
+    response = await http.send(request, stream=True)
+
+    try:
+        if response.is_success:
+            yield response
+            return
+
+        await response.aread()
+
+        try:
+            error = response.json().get("error")
+        except ValueError:
+            error = None
+
+        message = f"Error code: {response.status_code} - {error or response.text}"
+
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            raise RateLimitError(message, response=response, body=error)
+
+        if response.is_server_error:
+            raise InternalServerError(message, response=response, body=error)
+
+        raise APIStatusError(message, response=response, body=error)
+
+    finally:
+        await response.aclose()
+
+
+def usage(data: dict) -> None:
+    """
+    Count tokens reported in the completion `usage`, if any.
+    """
+    for kind in ("prompt", "completion"):
+        if tokens := (data.get("usage") or {}).get(f"{kind}_tokens"):
+            metrics.TOKENS.labels(kind).inc(tokens)
+
+
+async def receive(response: httpx.Response, observe: Callable[[dict], bool]) -> dict:
+    """
+    Parse streamed completion incrementally, stop as soon as `observe` decides so.
+
+    `observe` is called with the answer fields received so far, the partial answer
+    is returned, if it is stopped early.
+    """
+    parser = Parser()
+
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+
+        if (data := line.removeprefix("data:").strip()) == "[DONE]":
+            break
+
+        chunk = json.loads(data)
+
+        # reported by the last chunk
+        usage(chunk)
+
+        for choice in chunk.get("choices", []):
+            if text := (choice.get("delta") or {}).get("content"):
+                parser.feed(text)
+
+        if observe(parser.fields):
+            logger.debug("Completion is stopped early with fields: %s", list(parser.fields))
+            return parser.fields
+
+    return parser.result()
+
+
+async def complete(
+    client: AsyncOpenAI,
+    http: httpx.AsyncClient,
+    content: list[dict],
+    *,
+    model: str = MODEL,
+    tokens: int,
+    limiter: Limiter | None = None,
+    observe: Callable[[dict], bool] | None = None,
+) -> dict:
+    """
+    Request a single completion within the rate limit and parse it as JSON.
+
+    With `observe`, the completion is streamed, see `receive`.
+    """
+    for attempt in itertools.count(1):
+        if limiter is not None:
+            await limiter.acquire(tokens)
+
+        try:
+            with metrics.stage("completion"):
+                async with send(client, http, body(content, model=model, stream=observe is not None)) as response:
+                    if limiter is not None:
+                        limiter.update(response.headers)
+
+                    if observe is not None:
+                        return await receive(response, observe)
+
+                    await response.aread()
+
+                    usage(data := response.json())
+
+                    return json.loads(data["choices"][0]["message"]["content"])
+
+        except RateLimitError as error:
+            # exhausted quota will not be restored by waiting
+            if limiter is None or error.code == "insufficient_quota" or attempt >= ATTEMPTS:
+                raise
+
+            headers = error.response.headers
+
+            if (delay := headers.get("retry-after-ms")) is not None:
+                limiter.backoff(float(delay) / 1000)
+            else:
+                limiter.backoff(duration(headers.get("retry-after", "1")))
+
+        # the body is streamed by the client itself, so are its retries
+        except (httpx.TransportError, InternalServerError) as error:
+            if attempt >= ATTEMPTS:
+                raise
+
+            logger.warning("Completion attempt %s failed, retrying", attempt, exc_info=error)
+
+            await asyncio.sleep(2.0**attempt)
+
+
+def select(document: DOCUMENT | None, documents: list[DOCUMENT]) -> dict[str, list[DOCUMENT]]:
+    """
+    Group supported documents by analysis kind: main "document" and attached photos "response".
+    """
+    if document is not None and not supported(document):
         logger.warning("Unsupported document type: %s", document.type)
         document = None
 
-    for index, file in enumerate(documents.copy()):
-        if not file.type.startswith("image"):
+    for file in documents:
+        if not supported(file):
             logger.warning("Unsupported document type: %s", file.type)
-            del documents[index]
 
-    result = {"document": None, "response": None}
+    documents = list(filter(supported, documents))
 
-    # analyze document, if any
+    selected: dict[str, list[DOCUMENT]] = {}
 
     if document:
-        request = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "\n".join([ANALYZE_DOCUMENT, RESTRICTION]),
-                    },
-                    {
-                        "type": "text",
-                        "text": f"Claim description: {claim.description}",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{document.type};base64,{b64encode(document.data).decode('utf-8')}",
-                        },
-                    },
-                ],
-            }
-        ]
-
-        response = client.chat.completions.create(
-            # model="gpt-4-vision-preview",
-            model="gpt-4-turbo",
-            messages=request,
-            max_tokens=800,
-            stream=False,
-        )
+        selected["document"] = [document]
+
+    if documents:
+        selected["response"] = documents
 
-        result["document"] = json.loads(response.choices[0].message.content)
+    return selected
 
-    # analyse claim
 
-    if documents:
-        request = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "\n".join([ANALYZE_DOCUMENTS, RESTRICTION]),
-                    },
-                    # {
-                    #     "type": "text",
-                    #     "text": f"Claim description: {claim.description}",
-                    # },
-                ],
-            }
-        ]
-
-        for document in documents:
-            part = {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:{document.type};base64,{b64encode(document.data).decode('utf-8')}",
-                },
-            }
-
-            request[0]["content"].append(part)
-
-        response = client.chat.completions.create(
-            # model="gpt-4-vision-preview",
-            model="gpt-4-turbo",
-            messages=request,
-            max_tokens=800,
-            stream=False,
+def prompt(kind: str, claim: CLAIM) -> list[str]:
+    """
+    Text parts of the analysis request.
+    """
+    if kind == "document":
+        return ["\n".join([ANALYZE_DOCUMENT, RESTRICTION]), f"Claim description: {claim.description}"]
+    return ["\n".join([ANALYZE_DOCUMENTS, RESTRICTION])]
+
+
+def content(kind: str, claim: CLAIM, documents: list[DOCUMENT]) -> list[dict]:
+    """
+    Make user message content of the analysis request.
+    """
+    texts = [{"type": "text", "text": text} for text in prompt(kind, claim)]
+
+    return [*texts, *(part for file in documents for part in parts(file))]
+
+
+def body(content: list[dict], *, model: str = MODEL, stream: bool = False) -> dict:
+    """
+    Make chat completion request body.
+    """
+    request = {
+        # "model": "gpt-4-vision-preview",
+        "model": model,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": MAX_TOKENS,
+    }
+
+    if stream:
+        request["stream"] = True
+        request["stream_options"] = {"include_usage": True}
+
+    return request
+
+
+def key(kind: str, claim: CLAIM, documents: list[DOCUMENT], model: str = MODEL) -> str:
+    """
+    Cache key of the analysis request.
+    """
+
+    def sent(document: DOCUMENT) -> tuple[str | bytes, ...]:
+        if document.text is not None:
+            return (document.text.content, *(page.data for page in document.text.pages))
+        return payload(document)
+
+    return Cache.key(model, *prompt(kind, claim), *(part for file in documents for part in sent(file)))
+
+
+class OpenAI:
+    """
+    Backend of the OpenAI-compatible chat completions API.
+
+    Parameters
+    ----------
+    client : AsyncOpenAI
+        API client, provides base URL and credentials.
+    http : httpx.AsyncClient
+        Connections pool requests are streamed through.
+    model : str
+        Model name.
+    limiter : Limiter, optional
+        Rate limits shared by all calls.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        http: httpx.AsyncClient,
+        model: str = MODEL,
+        *,
+        limiter: Limiter | None = None,
+    ) -> None:
+        self.client, self.http, self.model, self.limiter = client, http, model, limiter
+
+    async def complete(
+        self,
+        kind: str,  # noqa: ARG002
+        content: list[dict],
+        *,
+        tokens: int,
+        observe: Callable[[dict], bool] | None = None,
+    ) -> dict:
+        return await complete(
+            self.client,
+            self.http,
+            content,
+            model=self.model,
+            tokens=tokens,
+            limiter=self.limiter,
+            observe=observe,
         )
 
-        result["response"] = json.loads(response.choices[0].message.content)
 
-    return result
+async def analyze(
+    backend: Backend,
+    claim: CLAIM,
+    document: DOCUMENT | None,
+    documents: list[DOCUMENT],
+    *,
+    cache: Store | None = None,
+    stream: bool = False,
+) -> dict:
+    """
+    Analyze claim document and attached photos concurrently.
+
+    Answers are looked up in the `cache` first, if any. Photos are not analyzed
+    for the irrelevant document, as such claim is rejected anyway. With `stream`,
+    the photos analysis waits until the document relevance is received, and
+    the document analysis is stopped as soon as it turns out irrelevant.
+    """
+    selected = select(document, documents)
+
+    keys = {kind: key(kind, claim, files, backend.model) for kind, files in selected.items()}
+
+    answers: dict[str, dict] = {}
+
+    if cache is not None:
+        for kind, value in keys.items():
+            if (answer := await cache.get(value)) is not None:
+                answers[kind] = answer
+
+    # relevance of the main document, None if unknown
+    relevance: asyncio.Future[bool | None] = asyncio.get_running_loop().create_future()
+
+    if "document" in answers:
+        relevance.set_result(answers["document"].get("relevant"))
+
+    elif "document" not in selected or not stream:
+        relevance.set_result(None)
+
+    def observe(fields: dict) -> bool:
+        if "relevant" in fields and not relevance.done():
+            relevance.set_result(fields["relevant"])
+
+        return fields.get("relevant") is False
+
+    async def single(kind: str, files: list[DOCUMENT]) -> None:
+        if kind == "response" and (await relevance) is False:
+            logger.debug("Claim %s document is not relevant, photos are not analyzed", claim.ID)
+            return
+
+        try:
+            answers[kind] = await backend.complete(
+                kind,
+                content(kind, claim, files),
+                tokens=estimate("".join(prompt(kind, claim)), files),
+                observe=observe if stream and kind == "document" else None,
+            )
+
+        finally:
+            if kind == "document" and not relevance.done():
+                relevance.set_result((answers.get("document") or {}).get("relevant"))
+
+        if cache is not None:
+            await cache.set(keys[kind], answers[kind])
+
+    async with asyncio.TaskGroup() as group:
+        for kind, files in selected.items():
+            if kind not in answers:
+                group.create_task(single(kind, files))
+
+    return {"document": None, "response": None} | answers
 
 
 # def describe(
@@ -0,0 +1,96 @@
+"""
+In-process cache of the claim read responses, validated by the claims data version.
+
+Every write visible in claim reads changes the version, which drops cached
+responses and changes their ETags. Writes of the other processes are seen through
+the claim events change stream, and responses expire anyway without it.
+"""
+
+import os
+import time
+import logging
+
+from collections import OrderedDict
+
+
+__all__: tuple[str] = ("RESPONSES", "Responses")
+
+
+class Responses:
+    """
+    Serialized responses cached by request until the claims data changes.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of cached responses, least recently used ones are evicted.
+    ttl : float
+        Seconds the version is valid for at most.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size, self.ttl, self.version, self.items = size, ttl, 0, OrderedDict()
+
+        self.since = time.monotonic()
+
+        # ETags of the previous runs never match
+        self.epoch = os.urandom(4).hex()
+
+    @property
+    def tag(self) -> str:
+        """
+        Weak ETag of the current claims data version.
+        """
+        return f'W/"{self.epoch}-{self.version}"'
+
+    def changed(self) -> None:
+        """
+        Invalidate cached responses and ETags after claims or results write.
+        """
+        self.version += 1
+        self.items.clear()
+
+        self.since = time.monotonic()
+
+    def expire(self) -> None:
+        """
+        Invalidate cached responses and ETags older than `ttl`.
+        """
+        if time.monotonic() - self.since >= self.ttl:
+            self.changed()
+
+    def matches(self, header: str | None) -> bool:
+        """
+        Check if `If-None-Match` header value has the current ETag, compared weakly.
+        """
+        if header is None:
+            return False
+
+        tags = {item.strip().removeprefix("W/") for item in header.split(",")}
+
+        return "*" in tags or self.tag.removeprefix("W/") in tags
+
+    def get(self, key: str) -> bytes | None:
+        if (body := self.items.get(key)) is not None:
+            self.items.move_to_end(key)
+        return body
+
+    def set(self, key: str, body: bytes, version: int) -> None:
+        """
+        Cache response `body` built from the data of `version`.
+        """
+        # data changed while the response was built, it is stale already
+        if version != self.version:
+            return
+
+        self.items[key] = body
+        self.items.move_to_end(key)
+
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+
+RESPONSES = Responses(1024, 60.0)
+
+
+logger = logging.getLogger(__name__)
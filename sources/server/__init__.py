@@ -1,14 +1,19 @@
+import time
 import asyncio
 import logging
 import contextlib
 
+from typing import Callable, Awaitable
 from dataclasses import dataclass
 
-from openai import OpenAI
-from fastapi import FastAPI
+import httpx
 
-from ailabs.claims import settings, integrations
+from openai import AsyncOpenAI
+from fastapi import FastAPI, Request, Response
+
+from ailabs.claims import metrics, settings, integrations
 from ailabs.claims.vendor import outlines
+from ailabs.claims.limiter import Limiter
 from ailabs.claims.utilities import Tasks, LineSuppressFilter, loadmodule
 
 
@@ -22,6 +27,8 @@ class Config:
 
     integrations: settings.integrations.Integrations
 
+    analyzer: settings.analyzer.Analyzer
+
 
 @contextlib.asynccontextmanager
 async def lifespan(application: FastAPI) -> None:
@@ -44,14 +51,29 @@ async def lifespan(application: FastAPI) -> None:
             raise TypeError(message)
 
         # load database
-        await loadmodule("database", __package__.rsplit(".", 1)[0], config.database)
+        database = await loadmodule("database", __package__.rsplit(".", 1)[0], config.database)
+
+        # queries work meanwhile, just slower
+        tasks.add(database.indexes())
+
+        # connections pool shared by all OpenAI requests, including the ones made without the client
+        application.state.http = httpx.AsyncClient(timeout=httpx.Timeout(600.0, connect=5.0))
 
-        # create OpenAI client
-        application.state.openai = OpenAI(api_key=config.general.token.get_secret_value())
+        # create OpenAI client, closing it closes the pool as well
+        application.state.openai = AsyncOpenAI(
+            api_key=config.general.token.get_secret_value(),
+            http_client=application.state.http,
+        )
+
+        # share OpenAI rate limits between all calls
+        application.state.limiter = Limiter(config.general.rpm, config.general.tpm)
 
         # load endpoints
         application.include_router((await loadmodule("endpoints", __package__, application)).router)
 
+        # start background analysis
+        await loadmodule("analyzer", __package__.rsplit(".", 1)[0], application)
+
     except asyncio.CancelledError:
         logging.getLogger("uvicorn.error").addFilter(suppressor)
         raise
@@ -63,15 +85,17 @@ async def lifespan(application: FastAPI) -> None:
 
     yield
 
-    application.state.openai.close()
-
     try:
-        tasks.cancel()
+        # in-flight analyses are finished, they are paid for already
+        await tasks.drain(config.analyzer.drain.total_seconds())
     except BaseException as error:
         logger.error("Error at server shutdown", exc_info=error)
         logging.getLogger("uvicorn.error").addFilter(suppressor)
         raise
 
+    finally:
+        await application.state.openai.close()
+
 
 def factory(config: Config) -> FastAPI:
     root = FastAPI(
@@ -80,6 +104,23 @@ def factory(config: Config) -> FastAPI:
         description=outlines.metadata["Summary"],
     )
 
+    @root.middleware("http")
+    async def measure(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        start = time.perf_counter()
+
+        response = await call_next(request)
+
+        # route template keeps labels cardinality bounded
+        route = request.scope.get("route")
+
+        metrics.REQUESTS.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            response.status_code,
+        ).observe(time.perf_counter() - start)
+
+        return response
+
     # load enabled integrations
     if config.integrations.dummy.enabled:
         root = integrations.dummy(root, "/integrations/dummy")
@@ -1,8 +1,24 @@
-from fastapi import APIRouter, status
-from fastapi.responses import UJSONResponse
+import json
+import uuid
+import base64
+import logging
+import collections
+
+from typing import Literal, Callable, Annotated, Awaitable, AsyncIterator
+from datetime import date, datetime, timezone, timedelta
+
+from beanie import BulkWriter, UpdateResponse
+from fastapi import Body, Query, Request, Response, APIRouter, status
+from pydantic import BaseModel, ValidationError, create_model
+from pymongo.errors import BulkWriteError
+from beanie.operators import In, Or, And
+from fastapi.responses import UJSONResponse, StreamingResponse
 from fastapi.exceptions import HTTPException
 
-from ailabs.claims.database.models import CLAIM, RESULT
+from ailabs.claims import stats, listing
+from ailabs.claims.analyzer import failures
+from ailabs.claims.responses import RESPONSES
+from ailabs.claims.database.models import STAT, CLAIM
 
 from . import models
 
@@ -20,22 +36,414 @@ CLAIM_AMOUNT_BELOW_THRESHOLD = models.Answer(
     reason=models.Answer.Reason.CLAIM_AMOUNT_BELOW_THRESHOLD,
 )
 
+# claims fetched from the database per round trip of the export
+BATCH: int = 500
+
+# items of the bulk request
+BULK: int = 1000
+
+# default and longest statistics periods, in days
+PERIOD: int = 30
+LONGEST: int = 366
+
+
+def encode(claim: models.Claim.Full) -> str:
+    """
+    Opaque cursor pointing past the `claim` in the listing order.
+    """
+    return base64.urlsafe_b64encode(json.dumps([claim.created.isoformat(), str(claim.ID)]).encode()).decode()
+
+
+def decode(cursor: str) -> tuple[date, uuid.UUID]:
+    """
+    Parse the cursor produced by `encode`.
+    """
+    try:
+        created, identifier = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(created), uuid.UUID(identifier)
+    except (ValueError, TypeError) as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor") from error
+
+
+async def cached(request: Request, build: Callable[[], Awaitable[BaseModel]]) -> Response:
+    """
+    Respond from the responses cache, with 304 if the client has the current version already.
+    """
+    RESPONSES.expire()
+
+    version, headers = RESPONSES.version, {"ETag": RESPONSES.tag, "Cache-Control": "no-cache"}
+
+    if RESPONSES.matches(request.headers.get("If-None-Match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    key = f"{request.url.path}?{request.url.query}"
+
+    if (body := RESPONSES.get(key)) is None:
+        body = (await build()).model_dump_json().encode()
+        RESPONSES.set(key, body, version)
+
+    return Response(body, media_type="application/json", headers=headers)
+
 
 @router.get(
     "",
     status_code=status.HTTP_200_OK,
-    response_model=list[models.Claim.Full],
+    response_model=models.Claim.Page,
+)
+async def fetch(
+    request: Request,
+    *,
+    limit: Annotated[int, Query(ge=1, le=1000, description="Maximum number of claims in the page.")] = 100,
+    cursor: Annotated[str | None, Query(description="Cursor of the page returned by the previous call.")] = None,
+    state: Annotated[
+        Literal["PENDING", "OPEN", "IN_PROGRESS", "CLOSED"] | None,
+        Query(alias="status", description="Claims status."),
+    ] = None,
+    customer: Annotated[uuid.UUID | None, Query(description="Customer submitted the claims.")] = None,
+    kind: Annotated[
+        Literal["RETURN", "COMPLAINT", "DISPUTE"] | None,
+        Query(alias="type", description="Type of the claims."),
+    ] = None,
+    since: Annotated[date | None, Query(description="Claims submitted on or after the date.")] = None,
+    until: Annotated[date | None, Query(description="Claims submitted on or before the date.")] = None,
+) -> Response:
+    async def build() -> models.Claim.Page:
+        filters = [
+            condition
+            for condition, enabled in (
+                (CLAIM.status == state, state is not None),
+                (CLAIM.customer == customer, customer is not None),
+                (CLAIM.type == kind, kind is not None),
+                (CLAIM.date >= since, since is not None),
+                (CLAIM.date <= until, until is not None),
+            )
+            if enabled
+        ]
+
+        # keyset pagination, ID breaks ties between claims created the same day
+        if cursor is not None:
+            created, identifier = decode(cursor)
+            filters.append(Or(CLAIM.created < created, And(CLAIM.created == created, CLAIM.ID < identifier)))
+
+        # one extra claim tells if there is the next page
+        claims = await listing.page(filters, limit + 1, models.Claim.Full).to_list()
+
+        page = models.Claim.Page(items=claims[:limit])
+
+        if len(claims) > limit:
+            page.cursor = encode(page.items[-1])
+
+        return page
+
+    return await cached(request, build)
+
+
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}}}},
 )
-async def fetch() -> UJSONResponse:
-    claims = []
+async def export(
+    fields: Annotated[
+        list[str] | None,
+        Query(description="Exported claim fields, all by default."),
+    ] = None,
+    since: Annotated[
+        date | None,
+        Query(description="Export claims updated on or after the date only."),
+    ] = None,
+) -> StreamingResponse:
+    fields = fields or list(models.Claim.Full.model_fields)
+
+    if unknown := set(fields) - set(models.Claim.Full.model_fields):
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+
+    # the database projects the requested fields only
+    projection = create_model(
+        "Export",
+        **{name: (info.annotation, info) for name, info in models.Claim.Full.model_fields.items() if name in fields},
+    )
+
+    query = CLAIM.find(CLAIM.updated >= since) if since is not None else CLAIM.find()
+
+    # unordered, sorting would block streaming of the incremental export
+    claims = query.aggregate(
+        listing.JOIN if "result" in fields else [],
+        projection_model=projection,
+        batchSize=BATCH,
+    )
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for claim in claims:
+            yield claim.model_dump_json().encode() + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def guards(update: models.Claim.Change) -> list:
+    """
+    Conditions the claim must meet to be changed by the `update`.
+    """
+    conditions = []
+
+    if update.status and update.status != "OPEN":
+        conditions.append(CLAIM.status != "PENDING")
+
+    if update.revision == 0:
+        # claims stored before revisions are counted have none
+        conditions.append(In(CLAIM.revision, [0, None]))
+
+    elif update.revision is not None:
+        conditions.append(CLAIM.revision == update.revision)
 
-    for item in await CLAIM.all().to_list():
-        claim = models.Claim.Full.from_orm(item)
-        result = await RESULT.find_one(RESULT.ID == claim.ID)
-        claim.result = models.Result.Nested.from_orm(result) if result else None
-        claims.append(claim)
+    return conditions
 
-    return claims
+
+def changes(update: models.Claim.Change) -> dict:
+    """
+    Update of the claim document, counting the revision.
+    """
+    return {
+        "$set": update.model_dump(exclude={"ID", "revision"}, exclude_defaults=True, exclude_unset=True)
+        | {"updated": datetime.now(timezone.utc).date()},
+        "$inc": {"revision": 1},
+    }
+
+
+def rejection(claim: CLAIM | None, update: models.Claim.Change) -> tuple[int, str] | None:
+    """
+    Status code and reason of the `update` rejection, None if it applies to the `claim`.
+    """
+    if claim is None:
+        return status.HTTP_404_NOT_FOUND, "Specified claim does not exist"
+
+    if update.revision is not None and update.revision != claim.revision:
+        return status.HTTP_409_CONFLICT, f"Claim revision is {claim.revision}, not {update.revision}"
+
+    if update.status and update.status != "OPEN" and claim.status == "PENDING":
+        return status.HTTP_403_FORBIDDEN, f"Pending claims status can be changed only to OPEN, not {update.status}"
+
+    return None
+
+
+@router.get(
+    "/stats",
+    status_code=status.HTTP_200_OK,
+    response_model=models.Stats,
+)
+async def statistics(
+    since: Annotated[date | None, Query(description="First day of the period, a month ago by default.")] = None,
+    until: Annotated[date | None, Query(description="Last day of the period, today by default.")] = None,
+) -> UJSONResponse:
+    until = until or datetime.now(timezone.utc).date()
+    since = since or until - timedelta(days=PERIOD - 1)
+
+    if not timedelta() <= until - since < timedelta(days=LONGEST):
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"Period must end after it starts and be shorter than {LONGEST} days",
+        )
+
+    # pre-aggregated rollups, their number depends on the period only
+    rollups = await STAT.find(STAT.day >= since, STAT.day <= until).to_list()
+
+    closed = [rollup for rollup in rollups if rollup.kind == "closed"]
+
+    # closed claims are rolled up by day of closing, summed over the period
+    closing = collections.Counter()
+
+    for rollup in closed:
+        closing[rollup.bucket] += rollup.total
+
+    total = sum(closing.values())
+
+    return models.Stats(
+        claims=[models.Stats.Claims.from_orm(item) for item in rollups if item.kind == "claims" and item.total],
+        results=[models.Stats.Results.from_orm(item) for item in rollups if item.kind == "results"],
+        closing=[models.Stats.Closing(days=days, count=count) for days, count in sorted(closing.items()) if count],
+        average=sum(rollup.days for rollup in closed) / total if total else None,
+    )
+
+
+def describe(error: ValidationError) -> str:
+    """
+    Short message of the item validation error.
+    """
+    return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+
+
+# registered before the single claim routes, which would take "bulk" for a claim identifier
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=list[models.Claim.Outcome],
+)
+async def submit_bulk(
+    items: Annotated[
+        list[dict],
+        Body(max_length=BULK, description="Claims in the `POST /claims` format, validated one by one."),
+    ],
+) -> UJSONResponse:
+    outcomes: list[models.Claim.Outcome | None] = [None] * len(items)
+
+    claims: dict[int, CLAIM] = {}
+
+    for index, item in enumerate(items):
+        try:
+            claim = CLAIM(**models.Claim.Submit.model_validate(item).dict() | {"status": "PENDING"})
+        except ValidationError as error:
+            outcomes[index] = models.Claim.Outcome(
+                index=index,
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                error=describe(error),
+            )
+            continue
+
+        # insert events are not triggered by bulk inserts
+        claim.add_updated()
+
+        claims[index] = claim
+
+    errors = {}
+
+    if claims:
+        try:
+            await CLAIM.insert_many(list(claims.values()), ordered=False)
+        except BulkWriteError as error:
+            indices = list(claims)
+            errors = {indices[item["index"]]: item["errmsg"] for item in error.details["writeErrors"]}
+
+        RESPONSES.changed()
+
+        await stats.record(
+            *(item for index, claim in claims.items() if index not in errors for item in stats.inserted(claim)),
+        )
+
+    for index, claim in claims.items():
+        outcomes[index] = models.Claim.Outcome(
+            index=index,
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR if index in errors else status.HTTP_200_OK,
+            ID=claim.ID,
+            error=errors.get(index),
+        )
+
+    return outcomes
+
+
+@router.patch(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=list[models.Claim.Outcome],
+)
+async def update_bulk(
+    items: Annotated[
+        list[dict],
+        Body(max_length=BULK, description="Claim updates in the `PATCH /claims/{claim}` format with claim ID."),
+    ],
+) -> UJSONResponse:
+    outcomes: list[models.Claim.Outcome | None] = [None] * len(items)
+
+    updates: dict[int, models.Claim.Patch] = {}
+
+    for index, item in enumerate(items):
+        try:
+            updates[index] = models.Claim.Patch.model_validate(item)
+        except ValidationError as error:
+            outcomes[index] = models.Claim.Outcome(
+                index=index,
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                error=describe(error),
+            )
+
+    # current statuses of all updated claims in one round trip
+    claims = {
+        claim.ID: claim
+        for claim in await CLAIM.find(In(CLAIM.ID, [update.ID for update in updates.values()])).to_list()
+    }
+
+    # revisions the items are based on, applied items are counted by the revisions after the write
+    revisions = {identifier: claim.revision or 0 for identifier, claim in claims.items()}
+
+    writer, written, increments = BulkWriter(), collections.defaultdict(list), {}
+
+    for index, update in updates.items():
+        outcome = outcomes[index] = models.Claim.Outcome(index=index, status=status.HTTP_200_OK, ID=update.ID)
+
+        claim = claims.get(update.ID)
+
+        if (rejected := rejection(claim, update)) is not None:
+            outcome.status, outcome.error = rejected
+            continue
+
+        increments[index] = stats.changed(claim, update.status or claim.status)
+
+        # guarded by the revision the item sees, the next item of the claim matches only after this one
+        conditions = guards(update.model_copy(update={"revision": claim.revision}))
+
+        await CLAIM.find_one(CLAIM.ID == update.ID, *conditions).update(changes(update), bulk_writer=writer)
+
+        # later items see changes of the earlier ones
+        claim.status, claim.revision = update.status or claim.status, claim.revision + 1
+
+        written[update.ID].append(index)
+
+    if not written:
+        return outcomes
+
+    # positions of the items in the bulk write
+    order = [index for index in updates if index in increments]
+
+    try:
+        # update events are not triggered by bulk writes
+        matched = (await writer.commit()).matched_count
+
+    except BulkWriteError as error:
+        # writes are ordered, the ones after the failed write are not applied
+        failure, matched = error.details["writeErrors"][0], error.details["nMatched"]
+
+        for position, index in enumerate(order[failure["index"] :]):
+            outcomes[index].status = status.HTTP_500_INTERNAL_SERVER_ERROR
+            outcomes[index].error = failure["errmsg"] if position == 0 else "Not applied after the previous failure"
+
+    # items not matching their guards are no errors of the bulk write, revisions tell which are applied
+    if matched < len(order):
+        current = {
+            item["ID"]: item.get("revision") or 0
+            for item in await CLAIM.find(In(CLAIM.ID, list(written))).aggregate(
+                [{"$project": {"_id": 0, "ID": 1, "revision": 1}}],
+            ).to_list()
+        }
+
+        counted = 0
+
+        for identifier, indices in written.items():
+            if identifier in current:
+                applied = min(max(current[identifier] - revisions[identifier], 0), len(indices))
+                rejected = status.HTTP_409_CONFLICT, "Claim is changed concurrently"
+
+            else:
+                applied, rejected = 0, (status.HTTP_404_NOT_FOUND, "Specified claim does not exist")
+
+            counted += applied
+
+            for index in indices[applied:]:
+                if outcomes[index].error is None:
+                    outcomes[index].status, outcomes[index].error = rejected
+
+        # writes of others in between make the revisions ambiguous
+        if counted != matched:
+            logger.warning("Bulk update raced other writes, %s items are applied of %s counted", matched, counted)
+
+    if succeeded := [index for index in order if outcomes[index].error is None]:
+        RESPONSES.changed()
+
+        await stats.record(*(item for index in succeeded for item in increments[index]))
+
+    return outcomes
 
 
 @router.post(
@@ -46,7 +454,13 @@ async def fetch() -> UJSONResponse:
 async def submit(
     claim: models.Claim.Submit,
 ) -> UJSONResponse:
-    return await CLAIM(**claim.dict() | {"status": "PENDING"}).insert()
+    claim = await CLAIM(**claim.dict() | {"status": "PENDING"}).insert()
+
+    RESPONSES.changed()
+
+    await stats.record(*stats.inserted(claim))
+
+    return claim
 
 
 @router.patch(
@@ -56,22 +470,92 @@ async def submit(
 )
 async def update(
     claim: models.Claim.Fetch.model_fields["ID"].annotation,  # noqa: F821
-    update: models.Claim.Update,
+    update: models.Claim.Change,
 ) -> UJSONResponse:
-    claim = await CLAIM.find_one(CLAIM.ID == claim)
+    change = changes(update)
 
-    if update.status and update.status != "OPEN" and claim.status == "PENDING":
-        raise HTTPException(
-            status.HTTP_403_FORBIDDEN,
-            f"Pending claims status can be changed only to OPEN, not {update.status}",
+    # the previous status is needed for statistics, the updated claim is made of it
+    previous = await CLAIM.find_one(CLAIM.ID == claim, *guards(update)).update(
+        change,
+        response_type=UpdateResponse.OLD_DOCUMENT,
+    )
+
+    if previous is None:
+        # another round trip on rejected updates only, to tell the reason
+        code, reason = rejection(await CLAIM.find_one(CLAIM.ID == claim), update) or (
+            status.HTTP_409_CONFLICT,
+            "Claim is changed concurrently",
         )
+        raise HTTPException(code, reason)
 
-    if claim is None:
+    RESPONSES.changed()
+
+    await stats.record(*stats.changed(previous, update.status or previous.status))
+
+    return previous.model_copy(update=change["$set"] | {"revision": previous.revision + 1})
+
+
+@router.get(
+    "/failed",
+    status_code=status.HTTP_200_OK,
+    response_model=list[models.Claim.Failed],
+)
+async def failed() -> UJSONResponse:
+    return [
+        models.Claim.Failed.from_orm(item)
+        for item in await CLAIM.find(CLAIM.failure.dead == True).to_list()  # noqa: E712
+    ]
+
+
+@router.post(
+    "/failed/requeue",
+    status_code=status.HTTP_200_OK,
+)
+async def requeue_all() -> UJSONResponse:
+    return {"requeued": await failures.requeue()}
+
+
+@router.post(
+    "/{claim}/requeue",
+    status_code=status.HTTP_200_OK,
+    response_model=models.Claim.Fetch,
+)
+async def requeue(
+    claim: models.Claim.Fetch.model_fields["ID"].annotation,  # noqa: F821
+) -> UJSONResponse:
+    if not await failures.requeue(CLAIM.ID == claim):
         raise HTTPException(
             status.HTTP_404_NOT_FOUND,
-            "Specified claim does not exist",
+            "Specified claim does not exist or is not dead-lettered",
         )
 
-    await claim.update({"$set": update.model_dump(exclude_defaults=True, exclude_unset=True)})
+    return await CLAIM.find_one(CLAIM.ID == claim)
 
-    return claim
+
+@router.get(
+    "/{claim}",
+    status_code=status.HTTP_200_OK,
+    response_model=models.Claim.Full,
+)
+async def get(
+    request: Request,
+    claim: models.Claim.Fetch.model_fields["ID"].annotation,  # noqa: F821
+) -> Response:
+    async def build() -> models.Claim.Full:
+        claims = await CLAIM.find(CLAIM.ID == claim).aggregate(
+            listing.JOIN,
+            projection_model=models.Claim.Full,
+        ).to_list()
+
+        if not claims:
+            raise HTTPException(
+                status.HTTP_404_NOT_FOUND,
+                "Specified claim does not exist",
+            )
+
+        return claims[0]
+
+    return await cached(request, build)
+
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, status
+from fastapi.responses import UJSONResponse
+
+from ailabs.claims import diagnostics
+
+from . import models
+
+
+router = APIRouter(prefix="/diagnostics")
+
+
+@router.get(
+    "/explain",
+    status_code=status.HTTP_200_OK,
+    response_model=list[models.Plan],
+)
+async def explain() -> UJSONResponse:
+    return [models.Plan.from_orm(plan) for plan in await diagnostics.diagnose()]
@@ -30,7 +30,7 @@ async def submit(
 
         await item.save()
 
-        items[document.filename] = item.model_dump(exclude=["data"])
+        items[document.filename] = item.model_dump(exclude=["data", "image", "text"])
 
     return items
 
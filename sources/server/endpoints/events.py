@@ -0,0 +1,263 @@
+"""
+Push notifications of claim status changes and analysis results.
+
+One broadcaster watches the database change stream and fans out events to all
+subscribers, so the number of subscribers does not multiply database reads.
+The same stream invalidates cached claim read responses on writes of any process.
+Change streams require a replica set, standalone deployments push nothing.
+"""
+
+import uuid
+import asyncio
+import logging
+import contextlib
+
+from typing import Iterator, Annotated, AsyncIterator
+from dataclasses import dataclass
+
+from fastapi import Query, Request, APIRouter, WebSocket, status
+from pymongo.errors import PyMongoError, OperationFailure
+from fastapi.responses import StreamingResponse
+
+from ailabs.claims.analyzer import intake
+from ailabs.claims.responses import RESPONSES
+from ailabs.claims.database.models import CLAIM, RESULT
+
+from . import models
+
+
+__all__: tuple[str] = ("Broadcaster", "router")
+
+
+# comment line sent to idle SSE subscribers, keeps proxies from closing the connection
+KEEPALIVE: float = 15.0
+
+# seconds before the failed change stream is resumed
+RETRY: float = 5.0
+
+# claim fields shown by claim reads, changes of the others, e.g. leases, keep cached responses
+VISIBLE: frozenset[str] = frozenset(models.Claim.Full.model_fields)
+
+
+# compared by identity to be kept in a set
+@dataclass(eq=False)
+class Subscriber:
+    queue: asyncio.Queue[models.Claim.Event]
+
+    claim: uuid.UUID | None = None
+
+    customer: uuid.UUID | None = None
+
+    def matches(self, event: models.Claim.Event) -> bool:
+        return (self.claim is None or self.claim == event.ID) and (
+            self.customer is None or self.customer == event.customer
+        )
+
+
+class Broadcaster:
+    """
+    Fans out claim events of one database change stream to the subscribers.
+
+    Parameters
+    ----------
+    size : int
+        Events buffered per subscriber, the oldest ones are dropped for slow subscribers.
+    """
+
+    subscribers: set[Subscriber]
+
+    def __init__(self, size: int = 100) -> None:
+        self.size, self.subscribers = size, set()
+
+    @contextlib.contextmanager
+    def subscribe(
+        self,
+        claim: uuid.UUID | None = None,
+        customer: uuid.UUID | None = None,
+    ) -> Iterator[asyncio.Queue[models.Claim.Event]]:
+        """
+        Receive events of the `claim` or the `customer` claims, all events if none given.
+        """
+        subscriber = Subscriber(asyncio.Queue(self.size), claim, customer)
+
+        self.subscribers.add(subscriber)
+
+        try:
+            yield subscriber.queue
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event: models.Claim.Event) -> None:
+        for subscriber in self.subscribers:
+            if not subscriber.matches(event):
+                continue
+
+            if subscriber.queue.full():
+                dropped = subscriber.queue.get_nowait()
+                logger.debug("Subscriber is too slow, dropping event of the claim %s", dropped.ID)
+
+            subscriber.queue.put_nowait(event)
+
+    @staticmethod
+    def visible(change: dict) -> bool:
+        """
+        Check if the change is seen in claim reads.
+        """
+        if change["operationType"] != "update":
+            return True
+
+        description = change["updateDescription"]
+
+        fields = {*description.get("updatedFields", {}), *description.get("removedFields", [])}
+
+        return any(field.split(".", 1)[0] in VISIBLE for field in fields)
+
+    @staticmethod
+    def notable(change: dict) -> bool:
+        """
+        Check if the change is pushed to subscribers: claim status update or result insert.
+        """
+        if change["ns"]["coll"] == RESULT.get_settings().name:
+            return True
+
+        return change["operationType"] == "update" and "status" in change["updateDescription"]["updatedFields"]
+
+    async def event(self, change: dict) -> models.Claim.Event | None:
+        """
+        Make event of the change, None if the changed document is gone.
+        """
+        if change["ns"]["coll"] == CLAIM.get_settings().name:
+            if (claim := await CLAIM.get(change["documentKey"]["_id"])) is None:
+                return None
+
+            return models.Claim.Event(type="status", ID=claim.ID, customer=claim.customer, status=claim.status)
+
+        if (document := change.get("fullDocument")) is None:
+            return None
+
+        result = RESULT.model_validate(document)
+
+        if (claim := await CLAIM.find_one(CLAIM.ID == result.ID)) is None:
+            return None
+
+        return models.Claim.Event(
+            type="result",
+            ID=claim.ID,
+            customer=claim.customer,
+            status=claim.status,
+            result=models.Result.Nested.from_orm(result),
+        )
+
+    async def run(self) -> None:
+        """
+        Publish claim status changes and stored results, invalidate cached responses, until cancelled.
+        """
+        pipeline = [
+            {
+                "$match": {
+                    "$or": [
+                        {"ns.coll": CLAIM.get_settings().name},
+                        {"ns.coll": RESULT.get_settings().name, "operationType": "insert"},
+                    ],
+                },
+            },
+        ]
+
+        database = CLAIM.get_motor_collection().database
+
+        token = None
+
+        while True:
+            try:
+                async with database.watch(pipeline, resume_after=token) as stream:
+                    async for change in stream:
+                        token = stream.resume_token
+
+                        if self.visible(change):
+                            RESPONSES.changed()
+
+                        # nobody listens, no need to read the claim
+                        if not self.subscribers or not self.notable(change):
+                            continue
+
+                        if (event := await self.event(change)) is not None:
+                            self.publish(event)
+
+            except PyMongoError as error:
+                code = error.code if isinstance(error, OperationFailure) else None
+
+                if code in intake.UNSUPPORTED:
+                    logger.warning("Change streams are not supported, claim events are not pushed")
+                    return
+
+                if code in intake.INVALIDATED and token is not None:
+                    logger.warning("Claim events stream can not be resumed, starting over")
+
+                    # writes in between are not seen
+                    RESPONSES.changed()
+
+                    token = None
+                    continue
+
+                logger.error("Claim events stream failed, resuming in %s seconds", RETRY, exc_info=error)
+
+                await asyncio.sleep(RETRY)
+
+
+router = APIRouter(prefix="/claims/events")
+
+
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"text/event-stream": {}}}},
+)
+async def stream(
+    request: Request,
+    claim: Annotated[uuid.UUID | None, Query(description="Push events of the claim only.")] = None,
+    customer: Annotated[uuid.UUID | None, Query(description="Push events of the customer claims only.")] = None,
+) -> StreamingResponse:
+    broadcaster: Broadcaster = request.app.state.broadcaster
+
+    async def events() -> AsyncIterator[str]:
+        with broadcaster.subscribe(claim, customer) as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield f"event: {event.type}\ndata: {event.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/ws")
+async def socket(
+    websocket: WebSocket,
+    claim: Annotated[uuid.UUID | None, Query(description="Push events of the claim only.")] = None,
+    customer: Annotated[uuid.UUID | None, Query(description="Push events of the customer claims only.")] = None,
+) -> None:
+    broadcaster: Broadcaster = websocket.app.state.broadcaster
+
+    await websocket.accept()
+
+    with broadcaster.subscribe(claim, customer) as queue:
+
+        async def forward() -> None:
+            while True:
+                await websocket.send_text((await queue.get()).model_dump_json())
+
+        forwarding = asyncio.create_task(forward())
+
+        try:
+            # messages of the client are ignored, waiting for it to disconnect
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            forwarding.cancel()
+
+
+logger = logging.getLogger(__name__)
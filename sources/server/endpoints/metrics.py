@@ -0,0 +1,15 @@
+from fastapi import APIRouter, status
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+
+router = APIRouter(prefix="/metrics")
+
+
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_class=Response,
+)
+async def fetch() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
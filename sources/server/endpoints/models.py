@@ -59,6 +59,32 @@ class Result:
         ]
 
 
+class Failure(BaseModel):
+    model_config: ConfigDict = ConfigDict(
+        from_attributes=True,
+    )
+
+    attempts: Annotated[
+        int,
+        Field(description="Number of failed analysis attempts."),
+    ]
+
+    error: Annotated[
+        str,
+        Field(description="Error of the last failed attempt."),
+    ]
+
+    retry: Annotated[
+        datetime | None,
+        Field(description="Time after which analysis is retried, None for dead-lettered claims."),
+    ] = None
+
+    dead: Annotated[
+        bool,
+        Field(description="Is analysis given up until the claim is requeued."),
+    ] = False
+
+
 class Claim:
     class Update(BaseModel):
         model_config: ConfigDict = ConfigDict(
@@ -162,6 +188,11 @@ class Claim:
             Field(description="Date when the claim record was last updated."),
         ]
 
+        revision: Annotated[
+            int,
+            Field(description="Number of the claim changes, to be passed with the next update."),
+        ] = 0
+
     class Full(Fetch):
         model_config: ConfigDict = ConfigDict(
             from_attributes=True,
@@ -172,6 +203,86 @@ class Claim:
             Field(description="AI processing result, if available."),
         ] = None
 
+    class Failed(Fetch):
+        model_config: ConfigDict = ConfigDict(
+            from_attributes=True,
+        )
+
+        failure: Annotated[
+            Failure,
+            Field(description="Failed analysis attempts."),
+        ]
+
+    class Page(BaseModel):
+        items: Annotated[
+            list["Claim.Full"],
+            Field(description="Claims of the page, newest first."),
+        ]
+
+        cursor: Annotated[
+            str | None,
+            Field(description="Opaque cursor of the next page, None on the last page."),
+        ] = None
+
+    class Change(Update):
+        revision: Annotated[
+            int | None,
+            Field(description="Claim revision the update is based on, stale revisions are rejected."),
+        ] = None
+
+    class Patch(Change):
+        ID: Annotated[
+            uuid.UUID,
+            Field(description="Identifier of the updated claim."),
+        ]
+
+    class Outcome(BaseModel):
+        index: Annotated[
+            int,
+            Field(description="Position of the item in the bulk request."),
+        ]
+
+        status: Annotated[
+            int,
+            Field(description="HTTP status code the item would get in a separate request."),
+        ]
+
+        ID: Annotated[
+            uuid.UUID | None,
+            Field(description="Identifier of the submitted or updated claim."),
+        ] = None
+
+        error: Annotated[
+            str | None,
+            Field(description="Reason of the item failure."),
+        ] = None
+
+    class Event(BaseModel):
+        type: Annotated[
+            Literal["status", "result"],
+            Field(description="Claim status is changed, or analysis result is stored."),
+        ]
+
+        ID: Annotated[
+            uuid.UUID,
+            Field(description="Identifier of the changed claim."),
+        ]
+
+        customer: Annotated[
+            uuid.UUID,
+            Field(description="Identifier of the customer submitted the claim."),
+        ]
+
+        status: Annotated[
+            Literal["PENDING", "OPEN", "IN_PROGRESS", "CLOSED"],
+            Field(description="Current status of the claim."),
+        ]
+
+        result: Annotated[
+            Result.Nested | None,
+            Field(description="Stored analysis result, for result events only."),
+        ] = None
+
 
 class Answer(BaseModel):
     model_config: ConfigDict = ConfigDict(
@@ -236,3 +347,117 @@ class Answer(BaseModel):
         dict[str, Document] | None,
         Field(description="Extra info extracted by LLM."),
     ] = None
+
+
+class Plan(BaseModel):
+    model_config: ConfigDict = ConfigDict(
+        from_attributes=True,
+    )
+
+    name: Annotated[
+        str,
+        Field(description="Registered query shape."),
+    ]
+
+    collection: Annotated[
+        str,
+        Field(description="Queried collection."),
+    ]
+
+    stages: Annotated[
+        list[str],
+        Field(description="Stages of the winning query plan."),
+    ]
+
+    scan: Annotated[
+        bool,
+        Field(description="Is the whole collection scanned, index is missing."),
+    ]
+
+
+class Stats(BaseModel):
+    class Claims(BaseModel):
+        model_config: ConfigDict = ConfigDict(
+            from_attributes=True,
+        )
+
+        day: Annotated[
+            date,
+            Field(description="Date when the claims were submitted."),
+        ]
+
+        status: Annotated[
+            Literal["PENDING", "OPEN", "IN_PROGRESS", "CLOSED"],
+            Field(description="Current status of the claims."),
+        ]
+
+        type: Annotated[
+            Literal["RETURN", "COMPLAINT", "DISPUTE"],
+            Field(description="Type of the claims."),
+        ]
+
+        count: Annotated[
+            int,
+            Field(validation_alias="total", description="Number of the claims."),
+        ]
+
+        amount: Annotated[
+            float,
+            Field(description="Total monetary value of the claims."),
+        ]
+
+        quantity: Annotated[
+            float,
+            Field(description="Total quantity of the claimed items."),
+        ]
+
+    class Results(BaseModel):
+        model_config: ConfigDict = ConfigDict(
+            from_attributes=True,
+        )
+
+        day: Annotated[
+            date,
+            Field(description="Date when the results were stored."),
+        ]
+
+        status: Annotated[
+            RESULT.Status,
+            Field(description="Suggested claims status."),
+        ]
+
+        count: Annotated[
+            int,
+            Field(validation_alias="total", description="Number of the results."),
+        ]
+
+    class Closing(BaseModel):
+        days: Annotated[
+            int,
+            Field(description="Days from the claim creation to closing, the last bucket holds the longer ones."),
+        ]
+
+        count: Annotated[
+            int,
+            Field(description="Number of the claims closed in that many days."),
+        ]
+
+    claims: Annotated[
+        list[Claims],
+        Field(description="Claims by submission date, status and type."),
+    ]
+
+    results: Annotated[
+        list[Results],
+        Field(description="Analysis results by date and status."),
+    ]
+
+    closing: Annotated[
+        list[Closing],
+        Field(description="Distribution of the time to close of the claims closed in the period."),
+    ]
+
+    average: Annotated[
+        float | None,
+        Field(description="Average days to close of the claims closed in the period, None if none."),
+    ] = None
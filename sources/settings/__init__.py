@@ -2,7 +2,7 @@ import importlib
 
 from typing import Annotated
 
-from pydantic import Field, Secret
+from pydantic import Field, Secret, PositiveInt
 
 from ailabs.claims.vendor.settings import (
     LOGLEVEL,
@@ -36,6 +36,16 @@ class General(Settings):
         Field(description="OpenAI API token."),
     ]
 
+    rpm: Annotated[
+        PositiveInt,
+        Field(description="OpenAI requests per minute limit."),
+    ] = 500
+
+    tpm: Annotated[
+        PositiveInt,
+        Field(description="OpenAI tokens per minute limit."),
+    ] = 30000
+
 
 class Logging(Logging):
     formatters: dict[str, Formatter] = {  # noqa: RUF012
@@ -103,5 +113,6 @@ class Logging(Logging):
     }
 
 
+analyzer = importlib.import_module(".analyzer", __package__)
 database = importlib.import_module(".database", __package__)
 integrations = importlib.import_module(".integrations", __package__)
@@ -0,0 +1,181 @@
+from typing import Literal, Annotated
+from datetime import timedelta
+
+from pydantic import Field, BaseModel, PositiveInt, PlainSerializer, NonNegativeFloat
+
+from ailabs.claims.vendor.settings import (
+    Settings,
+    SettingsConfigDict,
+)
+
+
+class Fake(BaseModel):
+    # median answer latency in seconds, latency is log-normally distributed
+    latency: NonNegativeFloat = 2.0
+
+    # spread of the latency distribution, larger values give longer tails
+    sigma: NonNegativeFloat = 0.5
+
+    # share of failed requests
+    errors: Annotated[float, Field(ge=0.0, le=1.0)] = 0.0
+
+    # share of documents answered as relevant
+    relevant: Annotated[float, Field(ge=0.0, le=1.0)] = 0.9
+
+    # answers are the same for the same requests and seed
+    seed: int = 0
+
+
+class Backend(BaseModel):
+    # analysis provider, "fake" answers locally without any calls
+    name: Literal["openai", "fake"] = "openai"
+
+    model: str = "gpt-4-turbo"
+
+    fake: Fake = Fake()
+
+
+class Cache(BaseModel):
+    enabled: bool = True
+
+    # lifetime of cached answers
+    ttl: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(days=30)
+
+    # maximum number of cached answers, the oldest are evicted
+    size: PositiveInt = 100000
+
+
+class Images(BaseModel):
+    enabled: bool = True
+
+    # images are fit into square of this side
+    resolution: PositiveInt = 2048
+
+    # and then scaled down to this shortest side, as vision model does
+    shortest: PositiveInt = 768
+
+    format: Literal["JPEG", "WEBP"] = "JPEG"
+
+    quality: Annotated[int, Field(ge=1, le=100)] = 85
+
+    # vision detail level, "auto" selects "low" for images fitting into a single tile
+    detail: Literal["auto", "low", "high"] = "auto"
+
+    # preprocessing processes, defaults to the number of CPUs
+    processes: PositiveInt | None = None
+
+
+class Extraction(BaseModel):
+    enabled: bool = True
+
+    # pages with fewer extracted characters are treated as scanned and sent as images
+    minimum: PositiveInt = 32
+
+    # maximum number of pages sent as images per document
+    pages: PositiveInt = 4
+
+    # rendering resolution of the scanned pages, they are downsized as images afterwards
+    dpi: PositiveInt = 150
+
+    # extracted text is truncated to this number of characters
+    characters: PositiveInt = 32000
+
+
+class Batch(BaseModel):
+    enabled: bool = False
+
+    # base URL of the OpenAI-compatible API with batch endpoints, defaults to OpenAI
+    url: str | None = None
+
+    # claims with amount up to this one are analyzed in batches
+    amount: float | None = None
+
+    # claims submitted this long ago are analyzed in batches
+    age: Annotated[
+        timedelta | None,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = None
+
+    # maximum number of claims in a single job
+    size: PositiveInt = 500
+
+    # how often collected claims are submitted and jobs are checked
+    interval: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(minutes=1)
+
+
+class Rules(BaseModel):
+    enabled: bool = True
+
+    # claims below amount threshold of their type are approved, general threshold is used for other types
+    thresholds: dict[Literal["RETURN", "COMPLAINT", "DISPUTE"], NonNegativeFloat] = {}
+
+    # accepted units of measure, any if empty
+    units: list[str] = []
+
+
+class Retry(BaseModel):
+    # failed analysis attempts before the claim is dead-lettered
+    attempts: PositiveInt = 5
+
+    # delay before the first retry, doubled for each next one and jittered
+    backoff: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(seconds=30)
+
+    # longest delay between retries
+    maximum: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(hours=1)
+
+
+class Analyzer(Settings):
+    model_config = SettingsConfigDict(toml_table_header=("analyzer",))
+
+    # maximum number of claims analyzed at once
+    workers: PositiveInt = 4
+
+    # maximum number of claims waiting for a worker, intake blocks when exceeded
+    backlog: PositiveInt = 1000
+
+    # claims processed first: with the highest amount or the oldest ones
+    priority: Literal["amount", "created"] = "amount"
+
+    # claim ownership duration, renewed while the claim is processed
+    lease: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(seconds=60.0)
+
+    # bytes of documents loaded by claims analyzed at once, larger claims are analyzed alone
+    memory: PositiveInt = 512 * 1024 * 1024
+
+    # stream answers, irrelevant documents are recognized before the answer is complete
+    stream: bool = True
+
+    backend: Backend = Backend()
+
+    retry: Retry = Retry()
+
+    rules: Rules = Rules()
+
+    # time to finish in-flight analyses on shutdown, they are cancelled afterwards
+    drain: Annotated[
+        timedelta,
+        PlainSerializer(lambda item: item.total_seconds(), return_type=float),
+    ] = timedelta(seconds=30)
+
+    cache: Cache = Cache()
+
+    images: Images = Images()
+
+    extraction: Extraction = Extraction()
+
+    batch: Batch = Batch()
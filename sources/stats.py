@@ -0,0 +1,104 @@
+"""
+Claim statistics rollups, maintained incrementally on every claim and result write.
+
+Rollups are counters per day, status and type, incremented by upserts along with
+the writes, so reading statistics does not scan claims. Writes of the claims
+which bypass the API are not counted.
+"""
+
+import logging
+
+from datetime import date, time, datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from ailabs.claims.database.models import STAT, CLAIM, RESULT
+
+
+__all__: tuple[str] = ("LONGEST", "changed", "concluded", "inserted", "record")
+
+
+# days to close, longer ones are counted in the last bucket
+LONGEST: int = 30
+
+
+def key(kind: str, day: date, status: str = "", type: str = "", bucket: int = 0) -> dict:  # noqa: A002
+    return {
+        "kind": kind,
+        "day": datetime.combine(day, time(), timezone.utc),
+        "status": status,
+        "type": type,
+        "bucket": bucket,
+    }
+
+
+def claims(claim: CLAIM, status: str, sign: int) -> UpdateOne:
+    return UpdateOne(
+        key("claims", claim.date, status, claim.type),
+        {"$inc": {"total": sign, "amount": sign * claim.amount, "quantity": sign * claim.quantity}},
+        upsert=True,
+    )
+
+
+def inserted(claim: CLAIM) -> list[UpdateOne]:
+    """
+    Count the new claim.
+    """
+    return [claims(claim, claim.status, 1)]
+
+
+def changed(claim: CLAIM, status: str) -> list[UpdateOne]:
+    """
+    Move the `claim` counted with its current status to the new `status`, count closing time.
+    """
+    if status == claim.status:
+        return []
+
+    operations = [claims(claim, claim.status, -1), claims(claim, status, 1)]
+
+    if status == "CLOSED":
+        today = datetime.now(timezone.utc).date()
+
+        days = (today - claim.created).days
+
+        operations.append(
+            UpdateOne(
+                key("closed", today, bucket=min(days, LONGEST)),
+                {"$inc": {"total": 1, "days": days}},
+                upsert=True,
+            ),
+        )
+
+    return operations
+
+
+def concluded(status: RESULT.Status, count: int = 1) -> list[UpdateOne]:
+    """
+    Count `count` results stored today.
+    """
+    return [
+        UpdateOne(
+            key("results", datetime.now(timezone.utc).date(), status.value),
+            {"$inc": {"total": count}},
+            upsert=True,
+        ),
+    ]
+
+
+async def record(*operations: UpdateOne) -> None:
+    """
+    Apply rollup increments in one round trip.
+
+    Statistics are secondary, failures are logged without failing the write they describe.
+    """
+    if not operations:
+        return
+
+    try:
+        await STAT.get_motor_collection().bulk_write(list(operations), ordered=False)
+    except PyMongoError:
+        logger.error("Failed to update statistics rollups", exc_info=True)
+
+
+logger = logging.getLogger(__name__)
@@ -4,7 +4,7 @@ import logging
 import importlib
 
 from types import ModuleType
-from typing import Awaitable
+from typing import Callable, Awaitable
 
 
 class LineSuppressFilter(logging.Filter):
@@ -23,8 +23,11 @@ class Tasks:
 
     tasks: set[asyncio.Task]
 
+    # called on shutdown to let tasks finish their work before cancellation
+    drains: list[Callable[[], Awaitable]]
+
     def __init__(self) -> None:
-        self.loop, self.tasks = asyncio.get_running_loop(), set()
+        self.loop, self.tasks, self.drains = asyncio.get_running_loop(), set(), []
 
     def callback(self, future: asyncio.Future) -> None:
         try:
@@ -53,6 +56,22 @@ class Tasks:
         queue.deque(task.cancel() for task in self.tasks)
         self.exits = False
 
+    async def drain(self, deadline: float) -> None:
+        """
+        Wait for drains up to `deadline` seconds, then cancel remaining tasks and wait for them.
+        """
+        try:
+            async with asyncio.timeout(deadline):
+                await asyncio.gather(*(drain() for drain in self.drains))
+        except TimeoutError:
+            logger.warning("Background tasks are not drained in %s seconds, cancelling", deadline)
+
+        tasks = list(self.tasks)
+
+        self.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 
 async def loadmodule(name: str, package: str, /, *args, **kwargs) -> ModuleType:
     try: